@@ -1,20 +1,42 @@
 import os
-import re
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Request, Response, current_app, g, render_template, request, jsonify, stream_with_context
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import HTTPException
 import time
-from datetime import datetime
+import json
+import queue
+import logging
+import importlib
+import threading
 import traceback
-import re
-import tempfile
-import pdfplumber
-import pytesseract
-from pdf2image import convert_from_path
 
-from Code.base.scraping import get_pdf_text, extract_claims
-from Code.base.patent_logic import analyze_claims
+from Code.base.pipeline import DEFAULT_MAX_TOKENS, MissingAPIKey, NoClaimsFound, llm_settings, run_incremental, run_pipeline
+from Code.base.cache import get_result_cache
+from Code.base.jobs import get_job_queue
+from Code.base.uploads import UPLOAD_MAX_MB, UploadTooLarge, UploadWriter, ingest
+from Code.base import metrics
+from Code.base import routing
+from Code.base.tokens import count_tokens
+
+# Per-request trace lines go to the "patentnerd.trace" logger
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+class UploadRequest(Request):
+    """Request whose multipart file parts are hashed straight into upload storage (see uploads.UploadWriter)."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        writer = UploadWriter(folder=current_app.config['UPLOAD_FOLDER'])
+        self.__dict__.setdefault('_upload_writers', []).append(writer)
+        return writer
+
+    def close(self):
+        # Also covers parts left behind when parsing failed half-way
+        super().close()
+        for writer in self.__dict__.get('_upload_writers', ()):
+            writer.close()
 
 app = Flask(__name__, template_folder = 'ui/templates')
+app.request_class = UploadRequest
 
 # Get the project root directory
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -24,11 +46,63 @@ UPLOAD_FOLDER      = 'uploads'
 ALLOWED_EXTENSIONS = {'pdf'}
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Werkzeug rejects larger bodies before reading them (1 MB slack for multipart framing)
+app.config['MAX_CONTENT_LENGTH'] = (UPLOAD_MAX_MB + 1) * 1024 * 1024
 
 # Function to check allowed file extensions
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def receive_upload():
+    """
+    Ingest the uploaded patent (multipart field 'patent', or a raw
+    application/pdf body with ?filename=...) into content-addressed storage.
+
+    Returns:
+        tuple: (StoredUpload, None) or (None, error response)
+    """
+    with metrics.span("upload_save") as span:
+        if request.mimetype == 'application/pdf':
+            filename = request.args.get('filename', 'upload.pdf')
+        else:
+            # Parsing the form streams each file part into an UploadWriter (see UploadRequest)
+            patent_file = request.files.get('patent')
+            if not patent_file:
+                return None, (jsonify({"error": "No file uploaded"}), 400)
+            filename = patent_file.filename or ''
+        if not allowed_file(filename):
+            return None, (jsonify({"error": "Only PDF uploads are supported"}), 400)
+        try:
+            if request.mimetype == 'application/pdf':
+                upload = ingest(request.stream, filename=secure_filename(filename), folder=app.config['UPLOAD_FOLDER'])
+            else:
+                upload = patent_file.stream.commit(secure_filename(filename))
+        except UploadTooLarge as e:
+            return None, (jsonify({"error": str(e)}), 413)
+        span.update(bytes=upload.size, existed=upload.existed)
+    app.logger.info(f"upload {upload.filename} -> {upload.sha256[:12]} ({upload.size} bytes, existing={upload.existed})")
+    return upload, None
+
+@app.before_request
+def start_trace():
+    if request.endpoint != 'metrics_endpoint':
+        g.trace = metrics.begin_trace(request.endpoint or request.path, method=request.method)
+
+@app.after_request
+def count_request(response):
+    metrics.REQUESTS.inc(endpoint=request.endpoint or "unknown", status=response.status_code)
+    return response
+
+@app.teardown_request
+def finish_trace(error=None):
+    trace = g.pop('trace', None)
+    if trace is not None:
+        metrics.end_trace(trace, error=repr(error) if error else None)
+
+@app.errorhandler(413)
+def too_large(e):
+    return jsonify({"error": f"Upload exceeds {UPLOAD_MAX_MB} MB"}), 413
+
 @app.route('/')
 def home():
     """Render the homepage."""
@@ -39,50 +113,56 @@ def about():
     """Render the about page."""
     return render_template('about.html')
 
+@app.route('/cache/stats')
+def cache_stats():
+    """Hit/miss counters for the LLM result cache."""
+    cache = get_result_cache()
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **cache.stats()})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for this process (stage latencies, LLM calls and tokens, rate-limit waits)."""
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/routes')
+def routes():
+    """Model routing table per prompt category, with measured latency and tokens per prompt/model."""
+    table = routing.routes(routing.LLM_MODEL, DEFAULT_MAX_TOKENS)
+    return jsonify({
+        "routes": {name: route.as_dict() for name, route in table.items()},
+        "measured": routing.route_report(),
+    })
+
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
     """Enhanced clause analysis endpoint with improved parsing and features"""
     try:
-        # Input validation
-        patent_file = request.files.get('patent')
-        if not patent_file:
-            return jsonify({"error": "No file uploaded"}), 400
-
-        # File handling
-        upload_path = os.path.join("uploads", patent_file.filename)
-        patent_file.save(upload_path)
+        # ✅ masked secrets: pull from environment (no hard-coded key)
+        try:
+            settings = llm_settings()
+        except MissingAPIKey as e:
+            return jsonify({"error": str(e)}), 500
 
-        # Extract text and claims
-        patent_text = get_pdf_text(upload_path)
-        claims = extract_claims(patent_text)
-        print('we got claims')
+        # Input validation and file handling
+        upload, error = receive_upload()
+        if error:
+            return error
 
-        # Enhanced analysis pipeline
+        # Extract text and claims, then run the analysis pipeline
         analysis_start = time.time()
         print('starting analysis...')
-
-        # ✅ masked secrets: pull from environment (no hard-coded key)
-        api_key = os.environ.get("OPENAI_API_KEY")
-        if not api_key:
-            return jsonify({"error": "Missing OPENAI_API_KEY environment variable"}), 500
-
-        api_base = os.environ.get("OPENAI_API_BASE", "https://api.sambanova.ai/v1")
-
-        final_evaluation = analyze_claims(
-            claims_text = claims,
-            model         = 'Meta-Llama-3.3-70B-Instruct',
-            role          = "user",
-            api_key       = api_key,
-            api_base      = api_base,
-            temperature   = 0.1,
-            top_p         = 1.0,
-            max_tokens    = 4096
-        )
+        final_evaluation = run_pipeline(upload.path, settings=settings, content_hash=upload.sha256)["results"]
 
         print(f"Analysis completed in {time.time() - analysis_start:.2f}s")
         return jsonify(final_evaluation)
 
+    except NoClaimsFound as e:
+        return jsonify({"error": "No claims found", "message": str(e)}), 422
+    except HTTPException:
+        raise   # e.g. 413 from MAX_CONTENT_LENGTH; rendered by its error handler
     except Exception as e:
         app.logger.error(f"Analysis error: {str(e)}", exc_info=True)
         return jsonify({
@@ -91,5 +171,153 @@ def analyze():
             "trace": traceback.format_exc() if app.debug else None
         }), 500
 
+@app.route('/analyze/incremental', methods=['POST'])
+def analyze_incremental():
+    """
+    Claim-by-claim analysis of a (revised) patent.
+
+    Optional form field (or query arg) `previous`: the "document" hash
+    returned for an earlier version. Claims that did not change, and do not
+    depend on a changed claim, reuse that version's results.
+    """
+    try:
+        settings = llm_settings()
+    except MissingAPIKey as e:
+        return jsonify({"error": str(e)}), 500
+    upload, error = receive_upload()
+    if error:
+        return error
+    previous = request.values.get('previous') or None
+
+    try:
+        out = run_incremental(upload.path, previous_hash=previous, settings=settings, content_hash=upload.sha256)
+    except NoClaimsFound as e:
+        return jsonify({"error": "No claims found", "message": str(e)}), 422
+    except Exception as e:
+        app.logger.error(f"Analysis error: {str(e)}", exc_info=True)
+        return jsonify({"error": "Analysis failed", "message": str(e)}), 500
+    return jsonify(out)
+
+def _sse(event, data):
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_stream():
+    """
+    Streaming variant of /analyze (Server-Sent Events).
+
+    Emits "extraction" once claims are extracted, "result" as each prompt
+    category completes, "delta" token chunks when the form field stream=1
+    is set, then "done" listing the categories whose LLM call failed (or
+    "error"). Closing the connection cancels any prompt calls that are
+    still pending.
+    """
+    try:
+        settings = llm_settings()
+    except MissingAPIKey as e:
+        return jsonify({"error": str(e)}), 500
+    upload, error = receive_upload()
+    if error:
+        return error
+    want_deltas = request.form.get('stream') == '1'
+
+    events = queue.Queue()
+    cancel = threading.Event()
+    extraction = {}
+    # The response outlives this view, so the worker thread closes the trace itself
+    trace = g.pop('trace', None)
+
+    def on_stage(stage, seconds, info):
+        if stage == "extract":
+            extraction.update(info, extract_seconds=seconds)
+        elif stage == "claims":
+            events.put(_sse("extraction", {**extraction, "claims_chars": info["chars"]}))
+
+    def work():
+        try:
+            out = run_pipeline(
+                upload.path,
+                settings=settings,
+                content_hash=upload.sha256,
+                on_stage=on_stage,
+                on_result=lambda name, text: events.put(_sse("result", {"prompt": name, "text": text})),
+                on_delta=(lambda name, delta: events.put(_sse("delta", {"prompt": name, "text": delta}))) if want_deltas else None,
+                cancel=cancel,
+            )
+            events.put(_sse("done", {"timings": out["timings"], "failed": out["failed"]}))
+        except Exception as e:
+            app.logger.error(f"Analysis error: {str(e)}", exc_info=True)
+            events.put(_sse("error", {"error": "Analysis failed", "message": str(e)}))
+        finally:
+            events.put(None)
+            if trace is not None:
+                metrics.end_trace(trace, cancelled=cancel.is_set())
+
+    # bind: the worker thread reports its spans to this request's trace
+    threading.Thread(target=metrics.bind(work), name="analyze-stream", daemon=True).start()
+
+    def generate():
+        try:
+            while True:
+                event = events.get()
+                if event is None:
+                    break
+                yield event
+        finally:
+            # Client went away (or we finished): stop outstanding LLM calls
+            cancel.set()
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue a patent for background analysis and return its job id right away."""
+    try:
+        llm_settings()
+    except MissingAPIKey as e:
+        return jsonify({"error": str(e)}), 500
+    upload, error = receive_upload()
+    if error:
+        return error
+
+    job_id = get_job_queue().submit(upload.path, filename=upload.filename)
+    return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Status, per-stage timings and (partial) results of a job."""
+    job = get_job_queue().store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify({
+        "job_id": job["id"],
+        "status": job["status"],
+        "filename": job["filename"],
+        "created": job["created"],
+        "updated": job["updated"],
+        "timings": job["timings"],
+        "extraction": job["extraction"],
+        "results": job["results"],
+        "error": job["error"],
+    })
+
+def warm_up():
+    """
+    Load what the first analysis would otherwise pay for: the PDF, OCR and
+    LLM client libraries, the tokenizer and the page templates. The gunicorn
+    master calls this before forking (see gunicorn.conf.py) so workers share
+    it. Connection pools, caches and the OCR process pool are per process
+    and are still created on first use, after the fork.
+    """
+    start = time.perf_counter()
+    for module in ("fitz", "pdfplumber", "PIL.Image", "pytesseract", "pdf2image", "httpx", "openai"):
+        importlib.import_module(module)
+    count_tokens("warm-up")
+    for template in ("index.html", "about.html"):
+        app.jinja_env.get_template(template)
+    print(f"[INFO] warm-up done in {time.perf_counter() - start:.2f}s")
+
 if __name__ == "__main__":
     app.run(host="127.0.0.1", port=8000, debug=False, use_reloader=False)
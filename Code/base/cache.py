@@ -0,0 +1,109 @@
+import os
+import json
+import hashlib
+import threading
+import diskcache
+
+# ---- Cache knobs (set via env vars) ----
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")), ".cache"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_SIZE_MB = int(os.getenv("LLM_CACHE_SIZE_MB", "512"))       # evicts least-recently-used beyond this
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))  # seconds; 0 disables expiry
+EXTRACT_CACHE_ENABLED = os.getenv("EXTRACT_CACHE_ENABLED", "1") == "1"
+EXTRACT_CACHE_SIZE_MB = int(os.getenv("EXTRACT_CACHE_SIZE_MB", "256"))
+CLAIM_STORE_SIZE_MB = int(os.getenv("CLAIM_STORE_SIZE_MB", "256"))   # per-document claim snapshots for incremental analysis
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_cache(name, size_mb):
+    """Return the named diskcache.Cache under CACHE_DIR, opened once per process."""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = diskcache.Cache(
+                os.path.join(CACHE_DIR, name),
+                size_limit=size_mb * 1024 * 1024,
+                eviction_policy="least-recently-used",
+            )
+            _caches[name] = cache
+        return cache
+
+def content_key(*parts):
+    """Stable SHA-256 over JSON-serialisable parts."""
+    blob = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_extract_cache():
+    """Process-wide extracted-text cache, or None when EXTRACT_CACHE_ENABLED=0."""
+    if not EXTRACT_CACHE_ENABLED:
+        return None
+    return get_cache("pdf_text", EXTRACT_CACHE_SIZE_MB)
+
+def get_claim_store():
+    """Per-document claim snapshots (see patent_logic.analyze_claims_incremental), keyed by PDF sha256."""
+    return get_cache("claim_snapshots", CLAIM_STORE_SIZE_MB)
+
+
+class ResultCache:
+    """
+    Persistent cache of LLM completions for analyze_claims.
+
+    Keys are a hash of the claims text, prompt template and model params, so
+    re-uploading an unchanged patent skips the completions entirely. Hit and
+    miss counters live in the cache itself and are shared across processes.
+    """
+
+    def __init__(self, name="llm_results", size_mb=LLM_CACHE_SIZE_MB, ttl=LLM_CACHE_TTL):
+        self.cache = get_cache(name, size_mb)
+        self.ttl = ttl or None
+
+    @staticmethod
+    def key(claims_text, prompt_template, model, temperature, top_p, max_tokens, variant=""):
+        """variant distinguishes prompt layouts that send the same inputs differently."""
+        parts = (claims_text, prompt_template, model, temperature, top_p, max_tokens)
+        return content_key(*parts, variant) if variant else content_key(*parts)
+
+    def get(self, key):
+        value = self.cache.get(key)
+        self.cache.incr("stats:hits" if value is not None else "stats:misses")
+        return value
+
+    def set(self, key, text):
+        """Store a completion; "Error: ..." results are never cached."""
+        if text is None or text.startswith("Error:"):
+            return
+        self.cache.set(key, text, expire=self.ttl)
+
+    def stats(self):
+        hits = self.cache.get("stats:hits", 0)
+        misses = self.cache.get("stats:misses", 0)
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "entries": len(self.cache),
+            "size_bytes": self.cache.volume(),
+        }
+
+
+_result_cache = None
+
+def get_result_cache():
+    """Process-wide ResultCache, or None when LLM_CACHE_ENABLED=0."""
+    global _result_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _result_cache is None:
+        _result_cache = ResultCache()
+    return _result_cache
@@ -0,0 +1,190 @@
+"""
+Structured claims: per-claim spans, "claim N" references and the dependency graph.
+
+A ClaimSet is parsed once from extracted claims text (see
+scraping.extract_claims). Each Claim keeps offsets into that text rather
+than a copy, plus the earlier claims it refers to. ancestors() and
+dependents() walk the graph, and unit_text() gives a claim together with
+every claim it depends on. families() groups each independent claim with
+its dependents, the unit incremental analysis sends to the LLM.
+"""
+import re
+import hashlib
+
+from Code.base import patent_parser
+
+# "claim 3", "claims 1 or 2", "any one of claims 1 to 4", "claims 1-3, 5 and 7"
+_REF_RE = re.compile(r'\bclaims?\s+(\d+(?:\s*(?:,|or|and|to|through|-|–)\s*\d+)*)', re.IGNORECASE)
+_REF_ITEM_RE = re.compile(r'(\d+)(?:\s*(?:to|through|-|–)\s*(\d+))?')
+_WS_RE = re.compile(r'\s+')
+
+
+def _references(text, number):
+    """Earlier claim numbers referred to in a claim's text."""
+    refs = set()
+    for m in _REF_RE.finditer(text):
+        for item in _REF_ITEM_RE.finditer(m.group(1)):
+            first = int(item.group(1))
+            last = int(item.group(2)) if item.group(2) else first
+            refs.update(n for n in range(first, min(last, number - 1) + 1) if 0 < n < number)
+    return tuple(sorted(refs))
+
+
+class Claim:
+    """One numbered claim: its span in ClaimSet.text and the claims it depends on."""
+    __slots__ = ("number", "start", "end", "parents")
+
+    def __init__(self, number, start, end, parents):
+        self.number = number
+        self.start = start
+        self.end = end
+        self.parents = parents   # tuple of earlier claim numbers; () for an independent claim
+
+    @property
+    def parent(self):
+        """The first claim referred to, or None for an independent claim."""
+        return self.parents[0] if self.parents else None
+
+    @property
+    def independent(self):
+        return not self.parents
+
+    def __repr__(self):
+        return f"Claim({self.number}, parents={self.parents})"
+
+
+class ClaimSet:
+    """Claims parsed from one claims text, with the dependency graph between them."""
+    __slots__ = ("text", "claims", "_by_number", "_children")
+
+    def __init__(self, text, claims):
+        self.text = text
+        self.claims = claims
+        self._by_number = {claim.number: claim for claim in claims}
+        self._children = {claim.number: [] for claim in claims}
+        for claim in claims:
+            for parent in claim.parents:
+                if parent in self._children:
+                    self._children[parent].append(claim.number)
+
+    def __len__(self):
+        return len(self.claims)
+
+    def __iter__(self):
+        return iter(self.claims)
+
+    def __getitem__(self, number):
+        return self._by_number[number]
+
+    def numbers(self):
+        return [claim.number for claim in self.claims]
+
+    def claim_text(self, number):
+        claim = self._by_number[number]
+        return self.text[claim.start:claim.end]
+
+    def ancestors(self, number):
+        """Every claim `number` depends on, directly or through other claims, in claim order."""
+        seen, stack = set(), list(self._by_number[number].parents)
+        while stack:
+            parent = stack.pop()
+            if parent in seen or parent not in self._by_number:
+                continue
+            seen.add(parent)
+            stack.extend(self._by_number[parent].parents)
+        return sorted(seen)
+
+    def dependents(self, number):
+        """Every claim that depends on `number`, directly or indirectly, in claim order."""
+        seen, stack = set(), list(self._children.get(number, ()))
+        while stack:
+            child = stack.pop()
+            if child in seen:
+                continue
+            seen.add(child)
+            stack.extend(self._children[child])
+        return sorted(seen)
+
+    def unit_text(self, number):
+        """The claim preceded by all of its ancestors: the context it is analyzed in."""
+        return "\n\n".join(self.claim_text(n) for n in self.ancestors(number) + [number])
+
+    def digest(self, number):
+        """Whitespace-insensitive hash of unit_text; changes when the claim or any ancestor does."""
+        return _digest(self.unit_text(number))
+
+    def families(self):
+        """
+        Claims grouped into families, [[numbers], ...] in claim order: each
+        independent claim with every claim depending on it. A claim that
+        depends on claims of two families joins them into one.
+        """
+        root = {claim.number: claim.number for claim in self.claims}
+
+        def find(n):
+            while root[n] != n:
+                root[n] = root[root[n]]
+                n = root[n]
+            return n
+
+        for claim in self.claims:
+            for parent in claim.parents:
+                if parent in root:
+                    a, b = find(claim.number), find(parent)
+                    root[max(a, b)] = min(a, b)
+        families = {}
+        for claim in self.claims:
+            families.setdefault(find(claim.number), []).append(claim.number)
+        return list(families.values())
+
+    def family_text(self, numbers):
+        return "\n\n".join(self.claim_text(n) for n in numbers)
+
+    def family_digest(self, numbers):
+        """Whitespace-insensitive hash of family_text; changes when any claim of the family does."""
+        return _digest(self.family_text(numbers))
+
+    def graph(self):
+        """{claim number: [parent numbers]} for JSON output."""
+        return {claim.number: list(claim.parents) for claim in self.claims}
+
+
+def _digest(text):
+    return hashlib.sha256(_WS_RE.sub(" ", text).strip().encode("utf-8")).hexdigest()
+
+
+def parse_claims(claims_text):
+    """ClaimSet from extracted claims text; claims are the last 1, 2, 3, ... run found by patent_parser."""
+    # The parser looks for claim numbers at line starts
+    text = "\n" + claims_text
+    parsed = patent_parser.parse(text)
+    claims = [Claim(number, start, end, _references(text[start:end], number))
+              for number, start, end in parsed.claims]
+    return ClaimSet(text, claims)
+
+
+def diff_claims(old, new):
+    """
+    Compare two ClaimSets by claim number.
+
+    "changed" claims have different text; "affected" adds every claim that
+    depends on a changed or added one, i.e. everything whose analysis is
+    stale. Claims are compared with whitespace collapsed.
+    """
+    def norm(claim_set, n):
+        return _WS_RE.sub(" ", claim_set.claim_text(n)).strip()
+
+    old_numbers, new_numbers = set(old.numbers()), set(new.numbers())
+    added = sorted(new_numbers - old_numbers)
+    removed = sorted(old_numbers - new_numbers)
+    changed = sorted(n for n in old_numbers & new_numbers if norm(old, n) != norm(new, n))
+    affected = set(added) | set(changed)
+    for n in list(affected):
+        affected.update(new.dependents(n))
+    return {
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "affected": sorted(affected),
+        "unchanged": sorted(new_numbers - affected),
+    }
@@ -0,0 +1,264 @@
+"""
+Background analysis jobs backed by SQLite.
+
+Jobs are rows in a local SQLite database, so they survive web and worker
+restarts. Every process that calls get_job_queue() (or runs
+`python -m Code.base.jobs`) starts a dispatcher thread that claims queued
+rows atomically and runs them on a thread pool of JOB_WORKERS. The web tier
+can set JOB_WORKERS=0 to only enqueue and leave the work to separate
+worker processes.
+
+While a job runs, a heartbeat thread refreshes its `updated` time every
+JOB_HEARTBEAT_SECONDS, so a job whose LLM calls take long is never mistaken
+for one whose worker died; only jobs without a heartbeat for
+JOB_STALE_SECONDS are requeued.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import socket
+import sqlite3
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from Code.base.cache import CACHE_DIR
+from Code.base import metrics
+
+# ---- Job knobs (set via env vars) ----
+JOBS_DB = os.getenv("JOBS_DB", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))                 # concurrent jobs per process; 0 = enqueue only
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))     # how often idle dispatchers look for work
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))  # how often running jobs are marked alive
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "300"))   # running jobs without a heartbeat for this long are requeued
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    status      TEXT NOT NULL,
+    filename    TEXT,
+    upload_path TEXT NOT NULL,
+    worker      TEXT,
+    created     REAL NOT NULL,
+    updated     REAL NOT NULL,
+    timings     TEXT NOT NULL DEFAULT '{}',
+    extraction  TEXT NOT NULL DEFAULT '{}',
+    results     TEXT NOT NULL DEFAULT '{}',
+    error       TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+"""
+
+
+class JobStore:
+    """Job rows in SQLite; one short-lived connection per operation."""
+
+    def __init__(self, path=JOBS_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, upload_path, filename=None, job_id=None):
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, filename, upload_path, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, filename, upload_path, now, now),
+            )
+        return job_id
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for field in ("timings", "extraction", "results"):
+            job[field] = json.loads(job[field])
+        return job
+
+    def claim(self, worker):
+        """Atomically move the oldest queued job to running; returns its id or None."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, updated = ? WHERE id = ?",
+                (RUNNING, worker, time.time(), row["id"]),
+            )
+            conn.execute("COMMIT")
+            return row["id"]
+
+    def heartbeat(self, job_ids, worker):
+        """Mark running jobs still owned by `worker` as alive."""
+        if not job_ids:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET updated = ? WHERE status = ? AND worker = ? AND id IN ({', '.join('?' * len(job_ids))})",
+                (time.time(), RUNNING, worker, *job_ids),
+            )
+
+    def requeue_stale(self, stale_seconds=JOB_STALE_SECONDS):
+        """Put running jobs whose worker stopped sending heartbeats back in the queue."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND updated < ?",
+                (QUEUED, RUNNING, time.time() - stale_seconds),
+            )
+            return cur.rowcount
+
+    def set_stage(self, job_id, stage, seconds, info=None):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT timings FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            timings = json.loads(row["timings"])
+            timings[stage] = seconds
+            params = [json.dumps(timings), time.time()]
+            sql = "UPDATE jobs SET timings = ?, updated = ?"
+            if stage == "extract" and info:
+                sql += ", extraction = ?"
+                params.append(json.dumps(info))
+            conn.execute(sql + " WHERE id = ?", (*params, job_id))
+            conn.execute("COMMIT")
+
+    def add_result(self, job_id, prompt_name, text):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT results FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            results = json.loads(row["results"])
+            results[prompt_name] = text
+            conn.execute(
+                "UPDATE jobs SET results = ?, updated = ? WHERE id = ?",
+                (json.dumps(results), time.time(), job_id),
+            )
+            conn.execute("COMMIT")
+
+    def finish(self, job_id, status, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+
+class JobQueue:
+    """Dispatcher thread plus worker pool that runs queued jobs from a JobStore."""
+
+    def __init__(self, store, workers=JOB_WORKERS):
+        self.store = store
+        self.workers = workers
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.pid = os.getpid()
+        self._wake = threading.Event()
+        self._slots = threading.BoundedSemaphore(max(1, workers))
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="job")
+        self._active = set()   # ids of jobs running in this process
+        self._active_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self.workers > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._dispatch, name="job-dispatcher", daemon=True)
+            self._thread.start()
+            threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True).start()
+        return self
+
+    def submit(self, upload_path, filename=None):
+        job_id = self.store.create(upload_path, filename)
+        self._wake.set()
+        return job_id
+
+    def _dispatch(self):
+        requeue = True
+        while True:
+            self._slots.acquire()
+            try:
+                if requeue:
+                    self.store.requeue_stale()
+                    requeue = False
+                job_id = self.store.claim(self.worker_id)
+                if job_id is not None:
+                    self._pool.submit(self._run, job_id)
+                    continue
+            except Exception as e:
+                # e.g. "database is locked"; keep polling rather than let the dispatcher die
+                print(f"[WARN] job dispatcher: {type(e).__name__}: {e}")
+            self._slots.release()
+            self._wake.wait(JOB_POLL_SECONDS)
+            self._wake.clear()
+            requeue = True
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(JOB_HEARTBEAT_SECONDS)
+            with self._active_lock:
+                job_ids = list(self._active)
+            try:
+                self.store.heartbeat(job_ids, self.worker_id)
+            except Exception as e:
+                print(f"[WARN] job heartbeat: {type(e).__name__}: {e}")
+
+    def _run(self, job_id):
+        # Imported here so enqueue-only web processes don't load the pipeline
+        from Code.base.pipeline import run_pipeline
+        with self._active_lock:
+            self._active.add(job_id)
+        try:
+            job = self.store.get(job_id)
+            print(f"[INFO] job {job_id} started on {self.worker_id}")
+            with metrics.trace("job", job_id=job_id):
+                run_pipeline(
+                    job["upload_path"],
+                    on_stage=lambda stage, seconds, info: self.store.set_stage(job_id, stage, seconds, info),
+                    on_result=lambda name, text: self.store.add_result(job_id, name, text),
+                )
+            self.store.finish(job_id, DONE)
+            print(f"[INFO] job {job_id} done")
+        except Exception as e:
+            traceback.print_exc()
+            self.store.finish(job_id, FAILED, error=str(e))
+        finally:
+            with self._active_lock:
+                self._active.discard(job_id)
+            self._slots.release()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Process-wide JobQueue, (re)started after a fork."""
+    global _queue
+    with _queue_lock:
+        if _queue is None or _queue.pid != os.getpid():
+            _queue = JobQueue(JobStore()).start()
+        return _queue
+
+
+if __name__ == "__main__":
+    # Standalone analysis worker: python -m Code.base.jobs
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    queue = get_job_queue()
+    print(f"[INFO] job worker {queue.worker_id} polling {queue.store.path} with {queue.workers} slot(s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,263 @@
+"""
+Pooled, rate-limited chat completions for the OpenAI-compatible backend.
+
+get_endpoint gives one connection-pooled client and RateLimiter per
+(api_base, api_key), shared by every request in the process. Each call
+holds one of LLM_MAX_INFLIGHT slots while its request is open, waits on the
+limiter (fed by x-ratelimit-* headers, optionally capped at LLM_RPS) and is
+retried on 429, 5xx and connection errors with jittered backoff that
+honours retry-after.
+"""
+import os
+import re
+import time
+import random
+import threading
+from contextlib import contextmanager
+
+from Code.base import metrics
+
+# ---- LLM transport knobs (set via env vars) ----
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "16"))          # in-flight LLM calls across this process
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "300"))                 # seconds per request
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))       # first retry waits up to this long
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60"))          # cap on a single backoff sleep
+LLM_RPS = float(os.getenv("LLM_RPS", "0"))                           # optional static request rate cap; 0 = headers only
+LLM_RATELIMIT_WINDOW = float(os.getenv("LLM_RATELIMIT_WINDOW", "60"))  # assumed reset window when headers give none
+LLM_LIMITER_MAX_WAIT = float(os.getenv("LLM_LIMITER_MAX_WAIT", "120"))  # longest a call waits on the limiter before going anyway
+
+# Shared by every analyze_claims call in the process (all requests, all threads)
+_inflight = threading.BoundedSemaphore(LLM_MAX_INFLIGHT)
+
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_UNIT_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def parse_duration(value):
+    """
+    Seconds from a rate-limit header value, or None.
+
+    Accepts plain seconds ("20", "0.5"), epoch timestamps, Go-style durations
+    ("6m0s", "250ms") as sent in OpenAI's x-ratelimit-reset-* headers.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        parts = _DURATION_RE.findall(value)
+        if not parts:
+            return None
+        return sum(float(n) * _UNIT_SECONDS[unit] for n, unit in parts)
+    if seconds > 1e9:   # absolute epoch time
+        return max(0.0, seconds - time.time())
+    return seconds
+
+def retry_after(headers):
+    """Server-requested wait in seconds from retry-after(-ms), or None."""
+    if headers is None:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    return parse_duration(headers.get("retry-after"))
+
+def backoff_delay(attempt, floor=None):
+    """Full-jitter exponential backoff, never shorter than a server-given floor."""
+    ceiling = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt))
+    return max(floor or 0.0, random.uniform(0, ceiling))
+
+
+class TokenBucket:
+    """
+    Token bucket whose level and refill rate follow the provider's headers.
+
+    Until the first response it admits everything (or paces at a static rate
+    when one is given). After each response, the level is set to the reported
+    remaining allowance and the rate to remaining / seconds-until-reset, so
+    calls are spread over the window instead of bursting into a 429. When
+    the reset time passes the bucket is full again, as the provider's is.
+    Without a reset header the window is assumed to be LLM_RATELIMIT_WINDOW,
+    and no call waits longer than LLM_LIMITER_MAX_WAIT.
+    """
+
+    def __init__(self, rate=0.0):
+        self.lock = threading.Lock()
+        self.rate = rate or None
+        self.capacity = max(1.0, rate) if rate else None
+        self.level = self.capacity
+        self.stamp = time.monotonic()
+        self.paused_until = 0.0
+        self.reset_at = None
+
+    def _refill(self, now):
+        if self.reset_at is not None and now >= self.reset_at:
+            self.level, self.reset_at = self.capacity, None
+        elif self.rate is not None:
+            self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def acquire(self, cost=1.0):
+        """Block until cost can be spent (at most LLM_LIMITER_MAX_WAIT); returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                cost = min(cost, self.capacity) if self.capacity else cost
+                overdue = waited >= LLM_LIMITER_MAX_WAIT
+                if overdue or (now >= self.paused_until and (self.level is None or self.level >= cost)):
+                    if overdue:
+                        print(f'[WARN] rate limiter wait exceeded {LLM_LIMITER_MAX_WAIT:.0f}s; sending anyway')
+                    if self.level is not None:
+                        self.level = max(0.0, self.level - cost)
+                    return waited
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                else:
+                    delay = (cost - self.level) / self.rate if self.rate else 0.05
+            delay = min(max(delay, 0.005), LLM_BACKOFF_MAX, LLM_LIMITER_MAX_WAIT - waited)
+            time.sleep(delay)
+            waited += delay
+
+    def update(self, limit, remaining, reset_seconds):
+        """Resync from a response's limit/remaining/reset headers."""
+        if remaining is None:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.capacity = max(1.0, limit or remaining or 1.0)
+            if reset_seconds is not None and reset_seconds <= 0:
+                # The window has already reset: the provider's bucket is full again
+                self.level, self.reset_at = self.capacity, None
+                return
+            self.level = min(self.capacity, remaining if self.level is None else min(self.level, remaining))
+            if reset_seconds is None and self.reset_at is None:
+                # No reset header: assume a window so the bucket still refills
+                reset_seconds = LLM_RATELIMIT_WINDOW
+            if reset_seconds is not None:
+                self.rate = max(remaining, 1.0) / reset_seconds
+                self.reset_at = now + reset_seconds
+
+    def pause(self, seconds):
+        """Admit nothing for the next seconds (after a 429)."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class RateLimiter:
+    """Request and token buckets for one endpoint, driven by x-ratelimit-* headers."""
+
+    def __init__(self):
+        self.requests = TokenBucket(rate=LLM_RPS)
+        self.tokens = TokenBucket()
+
+    def acquire(self, token_cost):
+        return self.requests.acquire(1) + self.tokens.acquire(token_cost)
+
+    def update(self, headers):
+        if headers is None:
+            return
+        for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+            try:
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                bucket.update(
+                    float(limit) if limit is not None else None,
+                    float(remaining) if remaining is not None else None,
+                    parse_duration(headers.get(f"x-ratelimit-reset-{kind}")),
+                )
+            except ValueError:
+                continue
+
+    def pause(self, seconds):
+        self.requests.pause(seconds)
+
+
+class Endpoint:
+    """A pooled OpenAI client plus its rate limiter for one (api_base, api_key)."""
+
+    def __init__(self, api_base, api_key):
+        # Imported here: openai alone is ~0.6s of start-up, and only analysis needs it
+        import httpx
+        import openai
+        self.http = httpx.Client(
+            timeout=LLM_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_INFLIGHT,
+                max_keepalive_connections=LLM_MAX_INFLIGHT,
+                keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+            ),
+        )
+        # max_retries=0: retries are ours, so they go through the limiter and honour `retries`
+        self.client = openai.OpenAI(api_key=api_key, base_url=api_base, max_retries=0, http_client=self.http)
+        self.limiter = RateLimiter()
+
+
+_endpoints = {}
+_endpoints_lock = threading.Lock()
+
+def get_endpoint(api_base, api_key):
+    """Process-wide Endpoint for (api_base, api_key), created on first use."""
+    with _endpoints_lock:
+        endpoint = _endpoints.get((api_base, api_key))
+        if endpoint is None:
+            endpoint = Endpoint(api_base, api_key)
+            _endpoints[(api_base, api_key)] = endpoint
+        return endpoint
+
+def _retryable(error):
+    import openai
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, openai.APIConnectionError)   # includes timeouts
+
+@contextmanager
+def chat_completion(endpoint, retries=5, token_cost=1, **create_kwargs):
+    """
+    chat.completions.create through the limiter, with jittered retries.
+
+    Up to `retries` retries on 429, 5xx, connection errors and timeouts,
+    waiting at least any retry-after the server sent. A process-wide
+    LLM_MAX_INFLIGHT slot is held while a request (including a streamed
+    body) is open, but not while backing off. Yields the parsed response.
+    """
+    import openai
+    for attempt in range(retries + 1):
+        waited = endpoint.limiter.acquire(token_cost)
+        if waited:
+            metrics.RATELIMIT_WAIT_SECONDS.observe(waited, reason="limiter")
+            metrics.record("ratelimit_wait", waited)
+        start = time.perf_counter()
+        _inflight.acquire()
+        queued = time.perf_counter() - start
+        if queued > 0.001:
+            metrics.record("inflight_wait", queued)
+        try:
+            raw = endpoint.client.chat.completions.with_raw_response.create(**create_kwargs)
+        except Exception as e:
+            _inflight.release()
+            headers = e.response.headers if isinstance(e, openai.APIStatusError) else None
+            endpoint.limiter.update(headers)
+            if not _retryable(e) or attempt == retries:
+                raise
+            delay = backoff_delay(attempt, retry_after(headers))
+            if isinstance(e, openai.RateLimitError):
+                endpoint.limiter.pause(delay)
+            print(f'[WARN] LLM call failed ({type(e).__name__}); retry {attempt + 1}/{retries} in {delay:.1f}s')
+            metrics.LLM_RETRIES.inc(error=type(e).__name__)
+            metrics.RATELIMIT_WAIT_SECONDS.observe(delay, reason="backoff")
+            metrics.record("retry_backoff", delay, error=type(e).__name__)
+            time.sleep(delay)
+            continue
+
+        try:
+            endpoint.limiter.update(raw.headers)
+            yield raw.parse()
+        finally:
+            _inflight.release()
+        return
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# ---- Instrumentation knobs (set via env vars) ----
+TRACE_LOG = os.getenv("TRACE_LOG", "1") == "1"   # log one JSON trace per request/job
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60, 120, 300)
+
+trace_logger = logging.getLogger("patentnerd.trace")
+
+
+def _label_str(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels (Prometheus text format)."""
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def totals(self):
+        """{label values: value} for every series."""
+        with self.lock:
+            return dict(self.values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_label_str(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels (Prometheus text format)."""
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.series = {}   # key -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def totals(self):
+        """{label values: (sum, count)} for every series."""
+        with self.lock:
+            return {key: (series[-2], series[-1]) for key, series in self.series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, series in sorted(self.series.items()):
+                names = self.labels + ("le",)
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_label_str(names, key + (bound,))} {count}")
+                lines.append(f"{self.name}_bucket{_label_str(names, key + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{_label_str(self.labels, key)} {series[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("patentnerd_stage_seconds", "Duration of pipeline stages.", ["stage"])
+LLM_CALL_SECONDS = Histogram("patentnerd_llm_call_seconds", "Duration of LLM calls per prompt category and model.", ["prompt", "model", "status"])
+LLM_TOKENS = Counter("patentnerd_llm_tokens_total", "Tokens reported by the LLM backend.", ["prompt", "model", "type"])
+RATELIMIT_WAIT_SECONDS = Histogram("patentnerd_ratelimit_wait_seconds", "Time spent waiting on the client-side rate limiter or retry backoff.", ["reason"])
+LLM_RETRIES = Counter("patentnerd_llm_retries_total", "LLM call retries by error type.", ["error"])
+PAGES = Counter("patentnerd_pages_total", "PDF pages processed by method.", ["method"])
+CACHE_LOOKUPS = Counter("patentnerd_cache_lookups_total", "Cache lookups by cache and result.", ["cache", "result"])
+REQUESTS = Counter("patentnerd_requests_total", "HTTP requests by endpoint and status.", ["endpoint", "status"])
+
+REGISTRY = [STAGE_SECONDS, LLM_CALL_SECONDS, LLM_TOKENS, RATELIMIT_WAIT_SECONDS, LLM_RETRIES, PAGES, CACHE_LOOKUPS, REQUESTS]
+
+def render_prometheus():
+    """All metrics of this process in Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---- Per-request traces ----
+
+class Trace:
+    """Spans recorded during one request or job; shared by the threads working on it."""
+
+    def __init__(self, name, **attrs):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.t0 = time.perf_counter()
+        self.lock = threading.Lock()
+        self.spans = []
+
+    def add(self, stage, seconds, end=None, **attrs):
+        end = time.perf_counter() if end is None else end
+        span = {"stage": stage, "at": round(end - seconds - self.t0, 4), "seconds": round(seconds, 4)}
+        span.update(attrs)
+        with self.lock:
+            self.spans.append(span)
+
+    def summary(self):
+        totals = {}
+        with self.lock:
+            for span in self.spans:
+                totals[span["stage"]] = round(totals.get(span["stage"], 0.0) + span["seconds"], 4)
+            spans = list(self.spans)
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            **self.attrs,
+            "start": self.start,
+            "seconds": round(time.perf_counter() - self.t0, 4),
+            "stage_totals": totals,
+            "spans": spans,
+        }
+
+_current = contextvars.ContextVar("patentnerd_trace", default=None)
+
+def current_trace():
+    return _current.get()
+
+def begin_trace(name, **attrs):
+    """Start a trace in the current context and return it."""
+    trace = Trace(name, **attrs)
+    _current.set(trace)
+    return trace
+
+def end_trace(trace, **attrs):
+    """Log a finished trace as one JSON line and detach it from the current context."""
+    if _current.get() is trace:
+        _current.set(None)
+    trace.attrs.update(attrs)
+    summary = trace.summary()
+    if TRACE_LOG:
+        trace_logger.info(json.dumps(summary, default=str))
+    return summary
+
+@contextmanager
+def trace(name, **attrs):
+    """Trace a block: spans recorded inside it (and in bound threads) are logged at the end."""
+    token = _current.set(None)
+    current = begin_trace(name, **attrs)
+    try:
+        yield current
+    finally:
+        end_trace(current)
+        _current.reset(token)
+
+def record(stage, seconds, **attrs):
+    """Record a duration measured elsewhere (e.g. in an OCR worker process)."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    current = _current.get()
+    if current is not None:
+        current.add(stage, seconds, **attrs)
+
+@contextmanager
+def span(stage, **attrs):
+    """Time a block as `stage`; extra attributes can be added to the yielded dict."""
+    start = time.perf_counter()
+    extra = dict(attrs)
+    try:
+        yield extra
+    finally:
+        record(stage, time.perf_counter() - start, **extra)
+
+def bind(fn):
+    """Wrap fn to run in a copy of the caller's context, so worker threads report to the same trace."""
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
@@ -1,52 +1,394 @@
-import pickle
-import openai
+"""
+LLM analysis of patent claims, one answer per prompt category.
+
+analyze_claims plans every category against the context window first:
+claim sets too large for one prompt are split into chunks (each carrying
+the claims its dependent claims refer to) that run in parallel and are
+merged back into one answer labelled by claim range; max_tokens is an upper
+bound reduced to the space left after each prompt. Completions are looked
+up in the persistent result cache (cache.py) and only the missing calls
+are sent; failed calls and fallback-model answers are not cached.
+
+analyze_claims_incremental runs the same analysis per claim family and
+reuses unchanged families from an earlier snapshot.
+"""
 import os
-import json
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from Code.base.openai_prompts import PROMPTS
+from Code.base.cache import ResultCache, content_key, get_result_cache
+from Code.base.claims import parse_claims
+from Code.base.tokens import LLM_CONTEXT_TOKENS, LLM_MIN_COMPLETION_TOKENS, completion_budget, count_tokens, plan_chunks
+from Code.base import prompt_assembly
+from Code.base.prompt_assembly import build_messages, build_multi_messages, message_text, parse_multi
+from Code.base.llm_client import chat_completion, get_endpoint
+from Code.base import metrics
+from Code.base import routing
+
+# ---- Concurrency knobs (set via env vars) ----
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", str(len(PROMPTS))))   # parallel prompts per analyze_claims call
+LLM_STREAM_USAGE = os.getenv("LLM_STREAM_USAGE", "1") == "1"              # ask for token usage on streamed calls
+INCREMENTAL_WORKERS = int(os.getenv("INCREMENTAL_WORKERS", "4"))           # claim families analyzed at once in incremental mode
+
+def _claims_label(chunk):
+    first, last = chunk[0][0], chunk[-1][0]
+    if first is None:
+        return "Claims"
+    return f"Claim {first}" if first == last else f"Claims {first}-{last}"
+
+def _plan_calls(prompt_template, claims_text, max_tokens, role):
+    """
+    Token-aware call plan for one prompt category.
+
+    If the whole prompt fits the context window this is a single call.
+    Otherwise the claims are split on claim-number boundaries and packed
+    into context-sized chunks, one call each; a chunk also carries the
+    claims its dependent claims refer to (as ClaimSet.unit_text does), so
+    every claim is read in context. Every call's max_tokens is capped to
+    what is left of the window after its prompt; it is None when that is
+    less than LLM_MIN_COMPLETION_TOKENS (a claim too large on its own),
+    and such a call is not sent.
+
+    Returns:
+        list: [(label, claims_chunk, messages, call_max_tokens), ...]
+    """
+    def budget(messages):
+        call_max_tokens = completion_budget(count_tokens(message_text(messages)), max_tokens)
+        return call_max_tokens if call_max_tokens >= min(max_tokens, LLM_MIN_COMPLETION_TOKENS) else None
+
+    messages = build_messages(prompt_template, claims_text, role)
+    prompt_tokens = count_tokens(message_text(messages))
+    if prompt_tokens + LLM_MIN_COMPLETION_TOKENS <= LLM_CONTEXT_TOKENS:
+        return [(None, claims_text, messages, budget(messages))]
+
+    overhead = count_tokens(message_text(build_messages(prompt_template, "", role)))
+    claim_set = parse_claims(claims_text)
+    if not len(claim_set):
+        # No numbered claims to split on
+        return [(None, claims_text, messages, budget(messages))]
+    ancestors = {n: claim_set.ancestors(n) for n in claim_set.numbers()}
+    calls = []
+    for chunk in plan_chunks([(n, claim_set.claim_text(n)) for n in claim_set.numbers()], overhead, ancestors=ancestors):
+        held = [number for number, _ in chunk]
+        numbers = sorted(set(held).union(*(ancestors[number] for number in held)))
+        chunk_text = "\n\n".join(claim_set.claim_text(n) for n in numbers)
+        messages = build_messages(prompt_template, chunk_text, role)
+        calls.append((_claims_label(chunk), chunk_text, messages, budget(messages)))
+    return calls
+
+def _merge_chunks(parts):
+    """
+    Reduce per-chunk answers [(label, text), ...] into one answer for the category.
+
+    If any chunk failed the category fails like a single call would (an
+    "Error: ..." answer). The chunks that succeeded are cached, so a rerun
+    only repeats the failed ones.
+    """
+    if len(parts) == 1:
+        return parts[0][1]
+    failed = [(label, text) for label, text in parts if text.startswith("Error:")]
+    if failed:
+        labels = ", ".join(label for label, _ in failed)
+        return f"Error: {len(failed)} of {len(parts)} chunks failed ({labels}): {failed[0][1][len('Error:'):].strip()}"
+    return "\n\n".join(f"{label}:\n{text}" for label, text in parts)
+
+def _run_prompt(endpoint, prompt_name, messages, model, temperature, top_p, max_tokens, retries=5, on_delta=None, cancel=None, json_mode=False):
+    """Run a single prompt call, returning its text or an "Error: ..." string."""
+    if cancel is not None and cancel.is_set():
+        return "Error: cancelled"
+
+    print(f'attempting prompt {prompt_name}')
+
+    start = time.perf_counter()
+    usage = None
+    try:
+        extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+        if on_delta is not None and LLM_STREAM_USAGE:
+            extra["stream_options"] = {"include_usage": True}
+        token_cost = count_tokens(message_text(messages)) + max_tokens
+        with chat_completion(
+            endpoint,
+            retries=retries,
+            token_cost=token_cost,
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            top_p=top_p,
+            max_tokens=max_tokens,
+            stream=on_delta is not None,
+            **extra,
+        ) as response:
+            if on_delta is None:
+                text = response.choices[0].message.content
+                usage = response.usage
+            else:
+                # Stream token deltas to the caller as they arrive
+                parts = []
+                for chunk in response:
+                    if cancel is not None and cancel.is_set():
+                        response.close()
+                        return "Error: cancelled"
+                    usage = getattr(chunk, "usage", None) or usage
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        on_delta(prompt_name, delta)
+                text = "".join(parts)
 
-# ✅ masked: avoid KeyError at import time; keep behavior otherwise
-client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY", ""))
+    except Exception as e:
+        text = f"Error: {e}"
+
+    seconds = time.perf_counter() - start
+    status = "error" if text.startswith("Error:") else "ok"
+    tokens = {}
+    if usage is not None:
+        tokens = {"prompt_tokens": usage.prompt_tokens or 0, "completion_tokens": usage.completion_tokens or 0}
+        metrics.LLM_TOKENS.inc(tokens["prompt_tokens"], prompt=prompt_name, model=model, type="prompt")
+        metrics.LLM_TOKENS.inc(tokens["completion_tokens"], prompt=prompt_name, model=model, type="completion")
+    metrics.LLM_CALL_SECONDS.observe(seconds, prompt=prompt_name, model=model, status=status)
+    metrics.record("llm_call", seconds, prompt=prompt_name, model=model, status=status, **tokens)
+
+    print(f'done with prompt {prompt_name}')
+    return text
+
+def _run_route(endpoint, route, messages, temperature, top_p, max_tokens, retries=5, on_delta=None, cancel=None):
+    """
+    _run_prompt on the route's model, then once more on its fallback model if that failed.
 
-def analyze_claims(claims_text, model, role, api_base, api_key, temperature, top_p, max_tokens, retries = 5): 
+    Returns:
+        tuple: (text, model that produced it)
+    """
+    text = _run_prompt(endpoint, route.name, messages, route.model, temperature, top_p, max_tokens,
+                       retries=retries, on_delta=on_delta, cancel=cancel)
+    if text.startswith("Error:") and route.fallback and not (cancel is not None and cancel.is_set()):
+        print(f'[WARN] {route.name} failed on {route.model} ({text[:80]}); retrying on {route.fallback}')
+        # Not streamed: the failed attempt may already have sent partial deltas
+        text = _run_prompt(endpoint, route.name, messages, route.fallback, temperature, top_p, max_tokens,
+                           retries=retries, cancel=cancel)
+        return text, route.fallback
+    return text, route.model
+
+def _run_batch(endpoint, routes, claims_text, role, temperature, top_p, max_tokens, retries=5, cancel=None):
+    """
+    Multi-category call: several categories sharing a model answered in one JSON reply.
+
+    Categories missing from the reply (or an unparseable reply) are retried
+    one by one with the normal layout, falling back like _run_route.
+
+    Returns:
+        dict: {prompt_name: (text, model)}
+    """
+    names = list(routes)
+    model = routes[names[0]].model
+    templates = {name: PROMPTS[name] for name in names}
+    messages = build_multi_messages(templates, claims_text, role)
+    budget = completion_budget(count_tokens(message_text(messages)), max_tokens * len(names))
+    text = _run_prompt(endpoint, "+".join(names), messages, model, temperature, top_p, budget,
+                       retries=retries, cancel=cancel, json_mode=prompt_assembly.PROMPT_BATCH_JSON_MODE)
+    answers = {name: (answer, model) for name, answer in parse_multi(text, names).items()}
+    for name in names:
+        if name not in answers:
+            print(f'batch reply missing {name}; retrying it on its own')
+            answers[name] = _run_route(endpoint, routes[name], build_messages(templates[name], claims_text, role),
+                                       temperature, top_p, max_tokens, retries=retries, cancel=cancel)
+    return answers
+
+def analyze_claims(claims_text, model, role, api_base, api_key, temperature, top_p, max_tokens, retries = 5, max_workers = None, use_cache = True, on_result = None, on_delta = None, cancel = None, claims_by_prompt = None):
     """
     Run all prompts from openai_prompts.py on the extracted claims text.
 
-    Args:
-        claims_text (str): Extracted claims text from PDF.
+    Each category runs on its route (routing.py) with messages laid out by
+    prompt_assembly.py, split into chunks when the claims don't fit the
+    context window (_plan_calls), and is sent concurrently on up to
+    max_workers threads through llm_client.py. Cached completions are
+    reused unless use_cache=False.
+
+    on_result(prompt_name, text) is called from this thread as each
+    category completes; on_delta(prompt_name, text_delta) streams tokens
+    from the worker threads. Setting cancel stops pending calls, which come
+    back as "Error: cancelled". claims_by_prompt maps categories to their
+    own claims text; None skips the category.
 
     Returns:
         dict: {prompt_name: response_text}
     """
-    # Define Llama client
-    client = openai.OpenAI(
-        api_key  = api_key,
-        base_url = api_base
-    )
-    
+    # Shared, connection-pooled Llama client and rate limiter for this backend
+    endpoint = get_endpoint(api_base, api_key)
+
+    cache = get_result_cache() if use_cache else None
+    batch_size = prompt_assembly.PROMPT_BATCH
+    variant = prompt_assembly.PROMPT_LAYOUT + (f"+batch{batch_size}" if batch_size > 1 else "")
+    if variant == "legacy":
+        variant = ""   # keep keys written before prompt layouts existed
+
+    prompt_claims = {prompt_name: (claims_by_prompt or {}).get(prompt_name, claims_text) for prompt_name in PROMPTS}
+    selected = [prompt_name for prompt_name in PROMPTS if prompt_claims[prompt_name] is not None]
+    route_table = routing.routes(model, max_tokens)
+
+    # Plan every call, then fill what we can from cached completions
+    parts = {}      # prompt_name -> [[label, text or None], ...] in chunk order
+    pending = []    # (route, index, messages, call_max_tokens, cache_key, claims_chunk)
+    for prompt_name in selected:
+        prompt_template = PROMPTS[prompt_name]
+        route = route_table[prompt_name]
+        calls = _plan_calls(prompt_template, prompt_claims[prompt_name], route.max_tokens, role)
+        if len(calls) > 1:
+            print(f'{prompt_name}: claims split into {len(calls)} chunks')
+        parts[prompt_name] = []
+        for index, (label, chunk_text, messages, call_max_tokens) in enumerate(calls):
+            if call_max_tokens is None:
+                # A truncated answer would look like a success (and be cached); fail the chunk instead
+                parts[prompt_name].append([label, f"Error: {label or 'claims'} too large for the "
+                                                  f"{LLM_CONTEXT_TOKENS}-token context window"])
+                continue
+            key = ResultCache.key(chunk_text, prompt_template, route.model, temperature, top_p, call_max_tokens, variant)
+            cached = cache.get(key) if cache is not None else None
+            if cache is not None:
+                metrics.CACHE_LOOKUPS.inc(cache="llm", result="miss" if cached is None else "hit")
+            parts[prompt_name].append([label, cached])
+            if cached is None:
+                pending.append((route, index, messages, call_max_tokens, key, chunk_text))
+    pending = routing.schedule(pending, lambda call: count_tokens(message_text(call[2])) + call[3])
 
-    # Build dictionary of prompt responses
     results = {}
 
-    for prompt_name, prompt_template in PROMPTS.items():
-        # Combine the base prompt with the patent text
-        user_prompt = f"{prompt_template}\n\nPatent text:\n{claims_text}"
-        print(f'attempting prompt {prompt_name}')
-
-        try:
-            response = client.chat.completions.create(
-                model=model,
-                messages=[{"role": role, "content": user_prompt}],
-                temperature=temperature,
-                top_p=top_p,
-                max_tokens=max_tokens,
-            )
-            results[prompt_name] = response.choices[0].message.content
-            time.sleep(1)
-
-        except Exception as e:
-            results[prompt_name] = f"Error: {e}"
-        
-        print(f'done with prompt {prompt_name}')
-
-    return results
+    def finish_if_complete(prompt_name):
+        if prompt_name not in results and all(text is not None for _, text in parts[prompt_name]):
+            results[prompt_name] = _merge_chunks(parts[prompt_name])
+            if on_result:
+                on_result(prompt_name, results[prompt_name])
+
+    for prompt_name in selected:
+        finish_if_complete(prompt_name)
+
+    if cache is not None:
+        n_calls = sum(len(p) for p in parts.values())
+        print(f'cache: {n_calls - len(pending)} hit(s), {len(pending)} miss(es)')
+
+    # Multi-category mode: group unchunked categories sharing claims text and model into batches
+    singles, batches = pending, []
+    if batch_size > 1:
+        unchunked = {}
+        for call in pending:
+            if len(parts[call[0].name]) == 1:
+                unchunked.setdefault((call[5], call[0].model), []).append(call)
+        singles = [call for call in pending if len(parts[call[0].name]) > 1]
+        batches = [group[i:i + batch_size] for group in unchunked.values() for i in range(0, len(group), batch_size)]
+
+    def store(route, index, key, text, answered_by):
+        parts[route.name][index][1] = text
+        if cache is not None and answered_by == route.model:
+            cache.set(key, text)
+        finish_if_complete(route.name)
+
+    workers = max(1, min(max_workers or LLM_MAX_WORKERS, len(singles) + len(batches) or 1))
+    # Heaviest first across batches and single calls; both lists are already in schedule() order
+    work = [("batch", batch) for batch in batches] + [("single", [call]) for call in singles]
+    work.sort(key=lambda item: -max(call[0].priority for call in item[1]))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm") as pool:
+        futures = {}
+        for kind, calls in work:
+            if kind == "batch":
+                batch_routes = {call[0].name: call[0] for call in calls}
+                future = pool.submit(metrics.bind(_run_batch), endpoint, batch_routes, calls[0][5], role,
+                                     temperature, top_p, min(call[3] for call in calls), retries, cancel)
+            else:
+                route, index, messages, call_max_tokens, key, _ = calls[0]
+                future = pool.submit(metrics.bind(_run_route), endpoint, route, messages,
+                                     temperature, top_p, call_max_tokens, retries, on_delta, cancel)
+            futures[future] = (kind, calls)
+
+        for future in as_completed(futures):
+            kind, calls = futures[future]
+            if kind == "single":
+                route, index, _, _, key, _ = calls[0]
+                store(route, index, key, *future.result())
+            else:
+                answers = future.result()
+                for route, index, _, _, key, _ in calls:
+                    store(route, index, key, *answers[route.name])
+
+    # Keep the PROMPTS ordering callers are used to
+    return {prompt_name: results[prompt_name] for prompt_name in selected}
+
+
+def analysis_fingerprint(model, temperature, top_p, max_tokens):
+    """Identifies everything besides the claim text that changes an analysis result."""
+    route_models = {name: [route.model, route.max_tokens] for name, route in routing.routes(model, max_tokens).items()}
+    return content_key(PROMPTS, model, temperature, top_p, max_tokens, route_models,
+                       prompt_assembly.PROMPT_LAYOUT, prompt_assembly.PROMPT_BATCH)
+
+def analyze_claims_incremental(claim_set, model, role, api_base, api_key, temperature, top_p, max_tokens, previous = None, retries = 5, max_workers = None, use_cache = True, on_claim = None, cancel = None):
+    """
+    Per-family analysis that reuses a previous run's results where possible.
+
+    The unit is a claim family (ClaimSet.families): an independent claim
+    with all of its dependents, analyzed by one analyze_claims call. Every
+    claim is sent once per category, so a run costs what a full run on the
+    changed families' text costs; document-wide categories still see each
+    family whole. Families are identified by ClaimSet.family_digest, so an
+    edit re-runs only the family it falls in and reuses the rest from
+    `previous`. Analyzed families still go through the result cache.
+
+    previous is the "snapshot" returned by an earlier call (or None for a
+    full run); it is ignored if the model settings or prompts changed.
+    on_claim(number, results) is called for each claim as its family
+    finishes.
+
+    Returns:
+        dict: {"claims": {number: {prompt_name: text}}, "families": [[numbers]], "reused": [numbers],
+               "reanalyzed": [numbers], "snapshot": {...} to pass as `previous` next time}
+    """
+    fingerprint = analysis_fingerprint(model, temperature, top_p, max_tokens)
+    stored = previous["units"] if previous and previous.get("fingerprint") == fingerprint else {}
+    settings = dict(model=model, role=role, api_base=api_base, api_key=api_key, temperature=temperature,
+                    top_p=top_p, max_tokens=max_tokens, retries=retries, max_workers=max_workers,
+                    use_cache=use_cache, cancel=cancel)
+
+    families = claim_set.families()
+    digests = [claim_set.family_digest(family) for family in families]
+    results, units = {}, {}
+
+    def finish(family, family_results):
+        for number in family:
+            results[number] = family_results
+            if on_claim:
+                on_claim(number, family_results)
+
+    todo = []
+    for family, digest in zip(families, digests):
+        if digest in stored:
+            units[digest] = stored[digest]
+            finish(family, stored[digest])
+        else:
+            todo.append((family, digest))
+    reanalyzed = sorted(n for family, _ in todo for n in family)
+    print(f'incremental: {len(families) - len(todo)} of {len(families)} claim families reused, {len(todo)} to analyze')
+
+    if todo:
+        workers = max(1, min(INCREMENTAL_WORKERS, len(todo)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="family") as pool:
+            futures = {pool.submit(metrics.bind(analyze_claims), claims_text=claim_set.family_text(family), **settings):
+                       (family, digest) for family, digest in todo}
+            for future in as_completed(futures):
+                family, digest = futures[future]
+                family_results = future.result()
+                # Failed categories are retried next time rather than reused
+                if not any(text.startswith("Error:") for text in family_results.values()):
+                    units[digest] = family_results
+                finish(family, family_results)
+
+    return {
+        "claims": {number: results[number] for number in claim_set.numbers()},
+        "families": families,
+        "reused": sorted(set(claim_set.numbers()) - set(reanalyzed)),
+        "reanalyzed": reanalyzed,
+        "snapshot": {
+            "fingerprint": fingerprint,
+            "claims": {number: {"parents": list(claim_set[number].parents)} for number in claim_set.numbers()},
+            "families": [{"claims": family, "digest": digest} for family, digest in zip(families, digests)],
+            "units": units,
+        },
+    }
+
+
@@ -0,0 +1,127 @@
+"""
+Single-pass parser for patent text: INID metadata, section headings and numbered claims.
+
+All patterns are compiled once at import. parse() walks the text with one
+combined regex and records offsets into the original string; nothing is
+copied until a caller asks for a field's text.
+"""
+import re
+
+# INID code per metadata field
+INID_CODES = {
+    'title': '54',
+    'abstract': '57',
+    'patent_number': '11',
+    'application_number': '21',
+    'priority_claim': '30',
+    'issue_date': '45',
+    'inventor': '72',
+    'assignee': '71',
+}
+
+# Free-text section headings (these vary by patent)
+TEXT_SECTIONS = {
+    'Background of the Invention': ["BACKGROUND", "BACKGROUND OF THE INVENTION"],
+    'Summary of the Invention': ["SUMMARY", "SUMMARY OF THE INVENTION"],
+    'Brief Description of the Invention': ["BRIEF DESCRIPTION OF THE INVENTION"],
+    'Brief Description of the Figures': ["BRIEF DESCRIPTION OF THE DRAWINGS", "BRIEF DESCRIPTION OF THE FIGURES"],
+    'Detailed Description of the Invention': ["DETAILED DESCRIPTION", "DETAILED DESCRIPTION OF THE INVENTION"]
+}
+
+_FIELD_BY_CODE = {code: field for field, code in INID_CODES.items()}
+_CANON_BY_HEADING = {v: canon for canon, variants in TEXT_SECTIONS.items() for v in variants}
+
+# One alternation whose branches all start with a literal character, so the
+# regex engine can jump straight to candidate positions: group 1 is an INID
+# code, group 2 a claim number, and anything else is a section heading
+# (longest first, so "BACKGROUND OF THE INVENTION" wins over "BACKGROUND").
+_HEADINGS = sorted(_CANON_BY_HEADING, key=len, reverse=True)
+_TOKEN_RE = re.compile('|'.join(
+    [r'\((%s)\)' % '|'.join(_FIELD_BY_CODE)]
+    + [re.escape(h).replace(r'\ ', r'\s+') + r'\b' for h in _HEADINGS]
+    + [r'\n[ \t]*(?:\d+[ \t]+)?(\d+)\.\s']
+))
+_WS_RE = re.compile(r'\s+')
+
+
+def _strip_span(text, start, end):
+    """(start, end) narrowed to exclude surrounding whitespace."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+class ParsedPatent:
+    """Offsets of metadata fields, sections and claims within `text`."""
+    __slots__ = ("text", "inid", "sections", "claims")
+
+    def __init__(self, text, inid, sections, claims):
+        self.text = text
+        self.inid = inid           # {field: (start, end)}, first occurrence of each code
+        self.sections = sections   # {canonical heading: (start, end)} of the body, last occurrence wins
+        self.claims = claims       # [(number, start, end)] of the last run of claims numbered 1, 2, 3, ...
+
+    def span_text(self, span, collapse=False):
+        start, end = span
+        text = self.text[start:end]
+        return _WS_RE.sub(' ', text) if collapse else text
+
+    def metadata(self):
+        """{field: value} for every INID field ('' when absent)."""
+        return {field: self.span_text(self.inid[field]) if field in self.inid else ''
+                for field in INID_CODES}
+
+    def section_texts(self, collapse=True):
+        """{canonical heading: body text}, whitespace collapsed by default."""
+        return {canon: self.span_text(span, collapse) for canon, span in self.sections.items()}
+
+    def claim_texts(self):
+        """[(number, text)] in claim order."""
+        return [(number, self.text[start:end]) for number, start, end in self.claims]
+
+
+def parse(text):
+    """
+    Parse patent text in one linear pass.
+
+    - INID fields: the rest of the line after the first "(54)", "(57)", ...
+    - Sections: a heading from TEXT_SECTIONS up to the next heading; a
+      heading that appears again replaces the earlier body
+    - Claims: a line starting "N." (optionally after a line number) opens
+      claim N when it is 1 or the next number in the current run; each run
+      starting at 1 replaces the previous one, so the last list wins
+    """
+    inid, sections, claims = {}, {}, []
+    current_section = None   # (canon, body start)
+    run = []                 # latest 1, 2, 3, ... run of claims: [number, start]
+
+    for m in _TOKEN_RE.finditer(text):
+        code, number = m.group(1, 2)
+        if code is not None:
+            field = _FIELD_BY_CODE[code]
+            if field not in inid:
+                line_end = text.find('\n', m.end())
+                inid[field] = _strip_span(text, m.end(), len(text) if line_end == -1 else line_end)
+        elif number is not None:
+            number = int(number)
+            if number == 1:
+                run = [[1, m.start(2)]]
+            elif run and number == run[-1][0] + 1:
+                run.append([number, m.start(2)])
+        else:
+            if m.start() and text[m.start() - 1].isalnum():
+                continue   # inside a longer word
+            if current_section is not None:
+                sections[current_section[0]] = _strip_span(text, current_section[1], m.start())
+            current_section = (_CANON_BY_HEADING[_WS_RE.sub(' ', m.group())], m.end())
+
+    if current_section is not None:
+        sections[current_section[0]] = _strip_span(text, current_section[1], len(text))
+
+    for i, (number, start) in enumerate(run):
+        end = run[i + 1][1] if i + 1 < len(run) else len(text)
+        claims.append((number,) + _strip_span(text, start, end))
+
+    return ParsedPatent(text, inid, sections, claims)
@@ -0,0 +1,141 @@
+import os
+import re
+
+from Code.base import metrics
+
+# ---- Text-extraction backend knobs (set via env vars) ----
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pymupdf")        # "pymupdf" or "pdfplumber"
+PDF_FALLBACK = os.getenv("PDF_FALLBACK", "pdfplumber")   # per-page fallback: "pdfplumber" or "ocr"
+
+# Characters that only show up when a font has no usable ToUnicode map
+_GARBAGE_RE = re.compile(r'\(cid:\d+\)|[\ufffd\ue000-\uf8ff\x00-\x08\x0b\x0c\x0e-\x1f]')
+_WORD_RE = re.compile(r'[A-Za-z]{2,}')
+
+def text_is_usable(text: str) -> bool:
+    """
+    Quality heuristic for embedded page text.
+
+    Rejects empty pages, pages with more than 5% glyph garbage ("(cid:12)",
+    U+FFFD, private-use or control characters) and pages where under a third
+    of the whitespace-separated tokens look like words.
+    """
+    stripped = text.strip()
+    if not stripped:
+        return False
+    garbage = sum(len(m.group(0)) for m in _GARBAGE_RE.finditer(stripped))
+    if garbage / len(stripped) > 0.05:
+        return False
+    tokens = stripped.split()
+    words = sum(1 for t in tokens if _WORD_RE.search(t))
+    return words / len(tokens) >= 0.33
+
+
+class PyMuPDFBackend:
+    """Embedded text via PyMuPDF (fitz): fast, low allocation."""
+    name = "pymupdf"
+
+    def __init__(self, pdf_path):
+        import fitz
+        self.doc = fitz.open(pdf_path)
+
+    @property
+    def page_count(self):
+        return self.doc.page_count
+
+    def page_text(self, index):
+        return self.doc[index].get_text() or ""
+
+    def close(self):
+        self.doc.close()
+
+
+class PdfplumberBackend:
+    """Embedded text via pdfplumber: slower, better on some odd layouts."""
+    name = "pdfplumber"
+
+    def __init__(self, pdf_path):
+        import pdfplumber
+        self.pdf = pdfplumber.open(pdf_path)
+
+    @property
+    def page_count(self):
+        return len(self.pdf.pages)
+
+    def page_text(self, index):
+        page = self.pdf.pages[index]
+        text = page.extract_text() or ""
+        page.close()   # drop cached layout objects; pdfplumber keeps them per page
+        return text
+
+    def close(self):
+        self.pdf.close()
+
+
+BACKENDS = {
+    PyMuPDFBackend.name: PyMuPDFBackend,
+    PdfplumberBackend.name: PdfplumberBackend,
+}
+
+
+class PdfTextSource:
+    """
+    Page-level embedded text with automatic fallback.
+
+    Pages come from the primary backend (PDF_BACKEND). If that text fails
+    text_is_usable and PDF_FALLBACK is "pdfplumber", the page is re-read with
+    pdfplumber (opened lazily, only when first needed). Pages that are still
+    unusable come back as "" so the caller's OCR path picks them up.
+    """
+
+    def __init__(self, pdf_path, backend=None, fallback=None):
+        self.pdf_path = str(pdf_path)
+        with metrics.span("page_count", backend=backend or PDF_BACKEND):
+            self.primary = BACKENDS[backend or PDF_BACKEND](self.pdf_path)
+            self._page_count = self.primary.page_count
+        self.fallback_name = fallback or PDF_FALLBACK
+        self._fallback = None
+        self.fallback_pages = 0
+
+    @property
+    def page_count(self):
+        return self._page_count
+
+    def _fallback_backend(self):
+        if self.fallback_name not in BACKENDS or self.fallback_name == self.primary.name:
+            return None
+        if self._fallback is None:
+            self._fallback = BACKENDS[self.fallback_name](self.pdf_path)
+        return self._fallback
+
+    def page_text(self, index):
+        with metrics.span("embedded_page", page=index + 1, backend=self.primary.name) as span:
+            text = self.primary.page_text(index)
+            if text_is_usable(text):
+                metrics.PAGES.inc(method=self.primary.name)
+                return text
+            fallback = self._fallback_backend()
+            if fallback is not None:
+                self.fallback_pages += 1
+                span["backend"] = fallback.name
+                text = fallback.page_text(index)
+                if text_is_usable(text):
+                    metrics.PAGES.inc(method=fallback.name)
+                    return text
+            span["usable"] = False
+            return ""
+
+    def close(self):
+        self.primary.close()
+        if self._fallback is not None:
+            self._fallback.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_document(pdf_path, backend=None, fallback=None):
+    """Open a PDF for page-level text extraction with the configured backends."""
+    return PdfTextSource(pdf_path, backend=backend, fallback=fallback)
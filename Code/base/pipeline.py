@@ -0,0 +1,184 @@
+import os
+import time
+from Code.base.scraping import get_pdf_text, extract_claims
+from Code.base.patent_logic import analyze_claims, analyze_claims_incremental
+from Code.base.cache import file_sha256, get_claim_store
+from Code.base.claims import diff_claims, parse_claims
+from Code.base import prescreen
+from Code.base import metrics
+from Code.base.routing import LLM_MODEL
+
+DEFAULT_API_BASE = "https://api.sambanova.ai/v1"
+DEFAULT_MAX_TOKENS = 4096   # completion budget for categories whose route doesn't set one
+
+
+class MissingAPIKey(RuntimeError):
+    """OPENAI_API_KEY is not set."""
+
+
+class NoClaimsFound(ValueError):
+    """No numbered claims could be extracted from the PDF."""
+
+
+def llm_settings():
+    """analyze_claims keyword arguments for the configured backend (per-category routes: see routing.py)."""
+    # ✅ masked secrets: pull from environment (no hard-coded key)
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        raise MissingAPIKey("Missing OPENAI_API_KEY environment variable")
+
+    return dict(
+        model       = LLM_MODEL,
+        role        = "user",
+        api_key     = api_key,
+        api_base    = os.environ.get("OPENAI_API_BASE", DEFAULT_API_BASE),
+        temperature = 0.1,
+        top_p       = 1.0,
+        max_tokens  = DEFAULT_MAX_TOKENS,
+    )
+
+
+def run_pipeline(pdf_path, settings=None, on_stage=None, on_result=None, on_delta=None, cancel=None, content_hash=None,
+                 patent_text=None, extraction=None):
+    """
+    Extract claims from a PDF and run every prompt category on them.
+
+    on_stage(stage, seconds, info) is called after "extract", "claims",
+    "prescreen" and "analyze" finish; on_result(prompt_name, text) as each
+    category lands. on_delta and cancel are passed through to
+    analyze_claims; content_hash (from uploads.ingest) lets extraction skip
+    hashing the file again. Callers that already extracted the text (batch
+    does it in separate processes) pass it as patent_text, with its stats as
+    extraction, and the "extract" stage is skipped.
+
+    Unless PRESCREEN_MODE=off, the rule-based pre-screen runs on the parsed
+    claims first: its report is added to the results under "prescreen" and
+    stands in for the categories it covers when their LLM call fails. With
+    PRESCREEN_MODE=filter those categories are only sent the flagged claims
+    (and skipped when nothing was flagged).
+
+    Returns:
+        dict: {"results": {prompt_name: text}, "timings": {stage: seconds}, "extraction": stats,
+               "prescreen": [finding dicts], "attempted": [prompt_name], "failed": [prompt_name]}
+
+    "attempted" lists the categories sent to the LLM and "failed" those whose
+    call ended in an error (even when the pre-screen filled in for them).
+    """
+    settings = settings or llm_settings()
+    timings = {}
+
+    def stage_done(stage, start, info=None):
+        seconds = time.perf_counter() - start
+        metrics.record(stage, seconds)
+        timings[stage] = round(seconds, 3)
+        if on_stage:
+            on_stage(stage, timings[stage], info or {})
+
+    extraction = extraction if extraction is not None else {}
+    if patent_text is None:
+        start = time.perf_counter()
+        patent_text = get_pdf_text(pdf_path, stats=extraction, content_hash=content_hash)
+        stage_done("extract", start, extraction)
+
+    start = time.perf_counter()
+    claims = extract_claims(patent_text)
+    stage_done("claims", start, {"chars": len(claims)})
+    if not claims.strip():
+        raise NoClaimsFound(f"No claims found in {os.path.basename(str(pdf_path))}")
+
+    if prescreen.PRESCREEN_MODE == "off":
+        start = time.perf_counter()
+        results = analyze_claims(claims_text=claims, on_result=on_result, on_delta=on_delta, cancel=cancel, **settings)
+        stage_done("analyze", start)
+        return {"results": results, "timings": timings, "extraction": extraction, "prescreen": [],
+                **_outcome(results)}
+
+    start = time.perf_counter()
+    claim_set = parse_claims(claims)
+    findings = prescreen.screen(claim_set)
+    claims_by_prompt = None
+    if prescreen.PRESCREEN_MODE == "filter" and len(claim_set):
+        claims_by_prompt = prescreen.flagged_claims_text(claim_set, findings)
+    stage_done("prescreen", start, {"claims": len(claim_set), "findings": len(findings)})
+
+    def result_ready(prompt_name, text):
+        on_result(prompt_name, prescreen.resolve(prompt_name, text, findings))
+
+    start = time.perf_counter()
+    raw = analyze_claims(claims_text=claims, on_result=result_ready if on_result else None, on_delta=on_delta,
+                         cancel=cancel, claims_by_prompt=claims_by_prompt, **settings)
+    results = prescreen.complete(raw, findings)
+    stage_done("analyze", start)
+    if on_result:
+        for prompt_name in results:
+            if prompt_name not in raw:
+                on_result(prompt_name, results[prompt_name])
+
+    return {"results": results, "timings": timings, "extraction": extraction,
+            "prescreen": [finding.as_dict() for finding in findings], **_outcome(raw)}
+
+
+def _outcome(results):
+    """{"attempted", "failed"} category lists of raw analyze_claims results (None = not sent)."""
+    attempted = [name for name, text in results.items() if text is not None]
+    return {"attempted": attempted, "failed": [name for name in attempted if results[name].startswith("Error:")]}
+
+
+def run_incremental(pdf_path, previous_hash=None, settings=None, on_stage=None, on_claim=None, cancel=None, content_hash=None):
+    """
+    Per-claim-family variant of run_pipeline for revised patents.
+
+    Claims are parsed into a ClaimSet and analyzed one family (independent
+    claim plus dependents) at a time (see analyze_claims_incremental). If
+    previous_hash names an earlier upload analyzed this way, its snapshot is
+    loaded from the claim store: only families with a changed claim are
+    sent to the LLM, and "diff" lists what changed. This run's snapshot is stored under the PDF's hash
+    for the next revision.
+
+    Returns:
+        dict: {"document", "results": {claim: {prompt_name: text}}, "graph", "families", "diff",
+               "reused", "reanalyzed", "timings", "extraction"}
+    """
+    settings = settings or llm_settings()
+    content_hash = content_hash or file_sha256(pdf_path)
+    timings = {}
+
+    def stage_done(stage, start, info=None):
+        seconds = time.perf_counter() - start
+        metrics.record(stage, seconds)
+        timings[stage] = round(seconds, 3)
+        if on_stage:
+            on_stage(stage, timings[stage], info or {})
+
+    start = time.perf_counter()
+    extraction = {}
+    patent_text = get_pdf_text(pdf_path, stats=extraction, content_hash=content_hash)
+    stage_done("extract", start, extraction)
+
+    start = time.perf_counter()
+    claims = extract_claims(patent_text)
+    claim_set = parse_claims(claims)
+    stage_done("claims", start, {"chars": len(claims), "claims": len(claim_set)})
+    if not claim_set:
+        raise NoClaimsFound(f"No claims found in {os.path.basename(str(pdf_path))}")
+
+    store = get_claim_store()
+    previous = store.get(previous_hash) if previous_hash else None
+    diff = diff_claims(parse_claims(previous["claims_text"]), claim_set) if previous else None
+
+    start = time.perf_counter()
+    out = analyze_claims_incremental(claim_set, previous=previous, on_claim=on_claim, cancel=cancel, **settings)
+    stage_done("analyze", start, {"reused": len(out["reused"]), "reanalyzed": len(out["reanalyzed"])})
+
+    store.set(content_hash, {**out["snapshot"], "claims_text": claims})
+    return {
+        "document": content_hash,
+        "results": out["claims"],
+        "graph": claim_set.graph(),
+        "families": out["families"],
+        "diff": diff,
+        "reused": out["reused"],
+        "reanalyzed": out["reanalyzed"],
+        "timings": timings,
+        "extraction": extraction,
+    }
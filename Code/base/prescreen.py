@@ -0,0 +1,224 @@
+"""
+Rule-based pre-screen of claims, run locally before (or instead of) the LLM.
+
+Three checks mirror LLM categories from openai_prompts.PROMPTS:
+
+- antecedent_issues: "the X" / "said X" where nothing earlier in the claim
+  or the claims it depends on introduced X ("a X", "one or more X", ...)
+- semantic_ambiguity: terms of degree ("substantially", "relatively", ...)
+- agency_and_control: self-acting adverbs ("automatically", "dynamically", ...)
+
+Each claim is scanned once per pattern with precompiled regexes; introduced
+terms are kept in a per-claim index of head nouns so antecedent checks are
+set lookups, and the whole claim set takes milliseconds.
+"""
+import os
+import re
+
+from Code.base.openai_prompts import PROMPTS
+
+# ---- Pre-screen knobs (set via env vars) ----
+PRESCREEN_MODE = os.getenv("PRESCREEN_MODE", "annotate")   # "off", "annotate" or "filter" (LLM sees only flagged claims)
+
+CATEGORIES = {
+    "antecedent": "antecedent_issues",
+    "degree": "semantic_ambiguity",
+    "agency": "agency_and_control",
+}
+RESULT_KEY = "prescreen"
+
+_WORD = r"[a-z][a-z0-9-]*"
+_PHRASE = r"((?:%s\s+){0,4}%s)" % (_WORD, _WORD)
+# Words that end a noun phrase
+_STOP = frozenset("""
+    a an the said of and or to in on at by for with from into onto over under between within without
+    is are be being been has have having was were wherein whereby which that such when while where
+    each first second third further other one more least plurality claim claims according as if
+    than so not its their it configured adapted operable arranged about across along around through
+    via upon after before during against toward towards per using based relative respectively
+    thereof therein thereto thereby may can will must should does do comprise comprises include
+    includes contain contains provide provides
+""".split())
+# Skipped at the start of a phrase ("the first gear" -> "gear")
+_ORDINALS = frozenset("first second third fourth further other".split())
+# Definite phrases that never need an antecedent
+_NO_ANTECEDENT = frozenset("same invention present following like art user step steps".split())
+
+# The phrase is captured in a lookahead so overlapping phrases ("the gear of the shaft") all match
+_INTRO_RE = re.compile(
+    r"\b(?:a|an|one or more|at least one|a plurality of|plurality of|two or more|multiple|several|"
+    r"another|some|first|second|third|fourth)\s+(?=%s)" % _PHRASE,
+    re.IGNORECASE,
+)
+_DEFINITE_RE = re.compile(r"\b(the|said)\s+(?=%s)" % _PHRASE, re.IGNORECASE)
+_DEGREE_RE = re.compile(
+    r"\b(substantially|approximately|about(?=\s+\d)|generally|relatively|essentially|significantly|"
+    r"sufficiently|slightly|nearly|roughly|considerably|comparatively|reasonably|appreciably|"
+    r"substantial|significant|sufficient|optimal(?:ly)?|suitabl[ey]|easily|readily)\b",
+    re.IGNORECASE,
+)
+_AGENCY_RE = re.compile(
+    r"\b(automatic(?:ally)?|dynamic(?:ally)?|autonomous(?:ly)?|adaptive(?:ly)?|spontaneous(?:ly)?|"
+    r"intelligent(?:ly)?|seamless(?:ly)?|self-[a-z]+|by itself|on its own|"
+    r"without (?:any )?(?:user|human|manual|operator) (?:input|intervention|interaction))\b",
+    re.IGNORECASE,
+)
+
+
+class Finding:
+    """One pre-screen hit: where it is and which LLM category it belongs to."""
+    __slots__ = ("kind", "claim", "term", "start", "end", "message")
+
+    def __init__(self, kind, claim, term, start, end, message):
+        self.kind = kind
+        self.claim = claim
+        self.term = term
+        self.start = start     # offsets within the claim's text
+        self.end = end
+        self.message = message
+
+    @property
+    def category(self):
+        return CATEGORIES[self.kind]
+
+    def as_dict(self):
+        return {"category": self.category, "claim": self.claim, "term": self.term,
+                "start": self.start, "end": self.end, "message": self.message}
+
+
+def _phrase(words):
+    """
+    Noun phrase words, lower-cased: up to the first stop word, adverb (-ly)
+    or participle (-ed/-ing after the first word). Words split by a
+    line-break hyphen ("manufac- turer") are joined back.
+    """
+    out, pending = [], ""
+    for word in words.lower().split():
+        if word.endswith("-"):
+            pending += word[:-1]
+            continue
+        word, pending = pending + word, ""
+        if not out and word in _ORDINALS:
+            continue
+        if word in _STOP or word.endswith("ly") or (out and word.endswith(("ed", "ing"))):
+            break
+        out.append(word)
+    return out
+
+def _head(word):
+    """Crude singular form, so "the gears" matches "a plurality of gears" and "a gear"."""
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+def _introduced(text, index):
+    """Add the words of every indefinitely introduced phrase in text to index (head-noun form)."""
+    for m in _INTRO_RE.finditer(text):
+        index.update(_head(word) for word in _phrase(m.group(1)))
+
+def _antecedent_findings(claim_set, number, text):
+    # Term index: every word introduced by an ancestor claim, then this claim as we go
+    index = set()
+    for ancestor in claim_set.ancestors(number):
+        _introduced(claim_set.claim_text(ancestor), index)
+    intros = sorted((m.start(), m.group(1)) for m in _INTRO_RE.finditer(text))
+    findings, reported, i = [], set(), 0
+    for m in _DEFINITE_RE.finditer(text):
+        while i < len(intros) and intros[i][0] < m.start():
+            index.update(_head(word) for word in _phrase(intros[i][1]))
+            i += 1
+        words = _phrase(m.group(2))
+        if not words or words[0] in _NO_ANTECEDENT:
+            continue
+        head = _head(words[-1])
+        if head in index or head in reported:
+            continue
+        reported.add(head)
+        term = f"{m.group(1)} {' '.join(words)}"
+        findings.append(Finding("antecedent", number, term, m.start(), m.start(2) + len(m.group(2)),
+                                f'"{term}" has no earlier "a/an {" ".join(words)}" in this claim or the claims it depends on'))
+    return findings
+
+def _term_findings(kind, pattern, number, text, message):
+    return [Finding(kind, number, m.group(1), m.start(1), m.end(1), message.format(term=m.group(1)))
+            for m in pattern.finditer(text)]
+
+def screen(claim_set):
+    """All findings for a ClaimSet, in claim order."""
+    findings = []
+    for claim in claim_set:
+        text = claim_set.claim_text(claim.number)
+        findings.extend(_antecedent_findings(claim_set, claim.number, text))
+        findings.extend(_term_findings("degree", _DEGREE_RE, claim.number, text,
+                                       'term of degree "{term}": give a standard for measuring it'))
+        findings.extend(_term_findings("agency", _AGENCY_RE, claim.number, text,
+                                       '"{term}" leaves unclear what starts or controls the action'))
+    return findings
+
+
+def category_markdown(findings, category):
+    """Findings for one LLM category as markdown, in the style of the LLM answers."""
+    lines = [f"- **Claim {f.claim}**: {f.message}" for f in findings if f.category == category]
+    return "\n".join(lines) if lines else "No issues found by the rule-based pre-screen."
+
+def report_markdown(findings):
+    """All findings grouped by category, for the "prescreen" entry of the results."""
+    sections = []
+    for category in CATEGORIES.values():
+        sections.append(f"### {category}\n{category_markdown(findings, category)}")
+    return f"Rule-based pre-screen: {len(findings)} finding(s).\n\n" + "\n\n".join(sections)
+
+def flagged_claims_text(claim_set, findings):
+    """
+    {category: claims text} holding only the claims flagged for that category,
+    each with the claims it depends on, or None when nothing was flagged.
+    """
+    texts = {}
+    for category in CATEGORIES.values():
+        flagged = {f.claim for f in findings if f.category == category}
+        if not flagged:
+            texts[category] = None
+            continue
+        numbers = set(flagged)
+        for number in flagged:
+            numbers.update(claim_set.ancestors(number))
+        texts[category] = "\n\n".join(claim_set.claim_text(n).strip() for n in sorted(numbers))
+    return texts
+
+def fallback_text(error_text, findings, category):
+    """
+    What to show for a covered category whose LLM call failed.
+
+    Keeps the "Error: ..." text first, so clients checking for the prefix
+    still see the category as failed.
+    """
+    return (f"{error_text}\n\nLLM analysis unavailable. Rule-based pre-screen findings:\n\n"
+            + category_markdown(findings, category))
+
+def resolve(prompt_name, text, findings):
+    """
+    One category's result with the pre-screen folded in.
+
+    A covered category the LLM skipped (text None: nothing flagged in filter
+    mode) gets the pre-screen's verdict, and one whose LLM call failed gets
+    fallback_text. Anything else is returned unchanged.
+    """
+    if prompt_name not in CATEGORIES.values():
+        return text
+    if text is None:
+        return category_markdown(findings, prompt_name)
+    if text.startswith("Error:"):
+        return fallback_text(text, findings, prompt_name)
+    return text
+
+def complete(results, findings):
+    """Results with every category resolved, in PROMPTS order, plus the RESULT_KEY report."""
+    out = {}
+    for prompt_name in PROMPTS:
+        text = resolve(prompt_name, results.get(prompt_name), findings)
+        if text is not None:
+            out[prompt_name] = text
+    out[RESULT_KEY] = report_markdown(findings)
+    return out
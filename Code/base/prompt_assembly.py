@@ -0,0 +1,80 @@
+"""
+Chat message layout for the prompt categories.
+
+With PROMPT_LAYOUT=shared_prefix (the default) the claims lead in a context
+message that is identical for every category and the category instruction
+follows, so the provider can reuse its prefix cache across one document's
+calls; "legacy" sends each filled-in template as one message. With
+PROMPT_BATCH > 1, categories that fit in one call are grouped PROMPT_BATCH
+at a time into multi-category calls answered as JSON (see parse_multi).
+"""
+import os
+import re
+import json
+
+# ---- Prompt layout knobs (set via env vars) ----
+PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "shared_prefix")   # "shared_prefix" or "legacy"
+PROMPT_BATCH = int(os.getenv("PROMPT_BATCH", "1"))           # categories per call; >1 = multi-category mode
+PROMPT_BATCH_JSON_MODE = os.getenv("PROMPT_BATCH_JSON_MODE", "1") == "1"  # send response_format=json_object
+
+# Every template in openai_prompts.py ends with this unfilled placeholder
+_PLACEHOLDER_RE = re.compile(r'\s*Patent text:\s*\{document\}\s*$')
+_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+CONTEXT_HEADER = (
+    "You are assisting with the review of a patent application. "
+    "The claims under review are below; the next message says what to check.\n\n"
+    "Patent text:\n"
+)
+
+def instruction(prompt_template: str) -> str:
+    """The category instruction without the trailing 'Patent text: {document}' placeholder."""
+    return _PLACEHOLDER_RE.sub("", prompt_template).strip()
+
+def context_message(claims_text: str) -> dict:
+    """Stable leading message holding the patent text, identical for every category."""
+    return {"role": "system", "content": CONTEXT_HEADER + claims_text}
+
+def build_messages(prompt_template: str, claims_text: str, role: str = "user", layout: str = None) -> list:
+    """
+    Chat messages for one category.
+
+    shared_prefix: the patent text goes first in a context message that is
+    byte-identical across categories, followed by the category instruction,
+    so providers with prefix/KV caching can reuse the long part.
+    legacy: the original single message, instruction first and patent text last.
+    """
+    layout = layout or PROMPT_LAYOUT
+    if layout == "legacy":
+        return [{"role": role, "content": f"{prompt_template}\n\nPatent text:\n{claims_text}"}]
+    return [context_message(claims_text), {"role": role, "content": instruction(prompt_template)}]
+
+def build_multi_messages(templates: dict, claims_text: str, role: str = "user") -> list:
+    """
+    Chat messages asking for several categories in one structured-output call.
+
+    The reply must be a JSON object keyed by category name; see parse_multi.
+    """
+    names = list(templates)
+    tasks = "\n\n".join(f"### {name}\n{instruction(template)}" for name, template in templates.items())
+    request = (
+        f"Carry out each of the {len(names)} review tasks below independently on the patent text.\n"
+        f"Reply with a single JSON object with exactly these keys: {json.dumps(names)}. "
+        "Each value is your complete answer to that task as a markdown string.\n\n"
+        f"{tasks}"
+    )
+    return [context_message(claims_text), {"role": role, "content": request}]
+
+def parse_multi(text: str, names) -> dict:
+    """Answers from a multi-category reply; categories that are missing or not strings are left out."""
+    try:
+        data = json.loads(_FENCE_RE.sub("", (text or "").strip()))
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {name: data[name] for name in names if isinstance(data.get(name), str) and data[name].strip()}
+
+def message_text(messages: list) -> str:
+    """All message content concatenated, for token counting."""
+    return "\n".join(m["content"] for m in messages)
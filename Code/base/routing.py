@@ -0,0 +1,124 @@
+"""
+Per-category model routing and call ordering.
+
+Every prompt category in openai_prompts.PROMPTS gets a Route: the model it
+runs on, its completion-token budget, a scheduling priority and an optional
+fallback model that is tried once when the primary call fails (answers from
+the fallback are not cached). Fields left unset use the caller's settings
+(pipeline.llm_settings). With no configuration every category runs on
+LLM_MODEL, but the default table lowers max_tokens for the three categories
+with short answers (structural_ambiguity, technology_evolution and
+level_of_skill_in_art).
+
+ROUTES below is the default table; LLM_ROUTES_FILE can override it per
+category with JSON such as
+
+    {"level_of_skill_in_art": {"model": "Meta-Llama-3.1-8B-Instruct", "max_tokens": 1024},
+     "glossary_recommendation": {"priority": 100, "fallback": "DeepSeek-V3-0324"}}
+
+analyze_claims sends calls in schedule() order, heaviest first, so the
+longest answers are never queued behind short ones.
+Latency and tokens are recorded per prompt and model in the LLM metrics;
+route_report() summarizes them for tuning the table.
+"""
+import os
+import json
+
+from Code.base.openai_prompts import PROMPTS
+from Code.base import metrics
+
+# ---- Routing knobs (set via env vars) ----
+LLM_MODEL = os.getenv("LLM_MODEL", "Meta-Llama-3.3-70B-Instruct")   # default model for every category
+LLM_LIGHT_MODEL = os.getenv("LLM_LIGHT_MODEL", "")        # model for LIGHT_CATEGORIES; "" = the default model
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "")  # tried once when a category's call fails; "" = none
+LLM_ROUTES_FILE = os.getenv("LLM_ROUTES_FILE", "")        # JSON {category: {model, max_tokens, priority, fallback}}
+
+# Short checks that a smaller model handles well
+LIGHT_CATEGORIES = ("level_of_skill_in_art", "technology_evolution")
+
+# Default table. Priority follows expected answer length (long lists first);
+# max_tokens None keeps the caller's budget.
+ROUTES = {
+    "glossary_recommendation":                 {"priority": 90},
+    "agency_and_control":                      {"priority": 80},
+    "semantic_ambiguity":                      {"priority": 70},
+    "process_explanation_and_enabling_detail": {"priority": 60},
+    "clarity_and_sufficiency":                 {"priority": 50},
+    "antecedent_issues":                       {"priority": 50},
+    "structural_ambiguity":                    {"priority": 40, "max_tokens": 2048},
+    "technology_evolution":                    {"priority": 30, "max_tokens": 1536},
+    "level_of_skill_in_art":                   {"priority": 20, "max_tokens": 1024},
+}
+if LLM_LIGHT_MODEL:
+    for _name in LIGHT_CATEGORIES:
+        ROUTES[_name]["model"] = LLM_LIGHT_MODEL
+
+if LLM_ROUTES_FILE:
+    with open(LLM_ROUTES_FILE, encoding="utf-8") as _f:
+        for _name, _overrides in json.load(_f).items():
+            if _name not in PROMPTS:
+                print(f"[WARN] {LLM_ROUTES_FILE}: unknown prompt category {_name!r} ignored")
+                continue
+            ROUTES.setdefault(_name, {}).update(_overrides)
+
+
+class Route:
+    """Resolved settings for one prompt category."""
+    __slots__ = ("name", "model", "max_tokens", "priority", "fallback")
+
+    def __init__(self, name, model, max_tokens, priority, fallback):
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+        self.priority = priority
+        self.fallback = fallback   # model name or None
+
+    def as_dict(self):
+        return {"model": self.model, "max_tokens": self.max_tokens, "priority": self.priority, "fallback": self.fallback}
+
+    def __repr__(self):
+        return f"Route({self.name}, {self.model}, max_tokens={self.max_tokens}, priority={self.priority})"
+
+
+def route_for(prompt_name, model, max_tokens):
+    """The Route of a category, with unset fields taken from the caller's model and max_tokens."""
+    config = ROUTES.get(prompt_name, {})
+    route_model = config.get("model") or model
+    fallback = config.get("fallback", LLM_FALLBACK_MODEL) or None
+    return Route(prompt_name, route_model, config.get("max_tokens") or max_tokens,
+                 config.get("priority", 0), fallback if fallback != route_model else None)
+
+def routes(model, max_tokens):
+    """{prompt_name: Route} for every category, in PROMPTS order."""
+    return {prompt_name: route_for(prompt_name, model, max_tokens) for prompt_name in PROMPTS}
+
+def schedule(calls, cost):
+    """
+    calls ordered heaviest first: by route priority, then by cost(call)
+    (prompt plus completion tokens), both descending. calls are
+    (route, ...) tuples; the sort is stable.
+    """
+    return sorted(calls, key=lambda call: (-call[0].priority, -cost(call)))
+
+
+def route_report():
+    """
+    Measured LLM calls per prompt category and model since start-up:
+    {"prompt|model": {calls, errors, mean_seconds, prompt_tokens, completion_tokens, mean_completion_tokens}}.
+    """
+    report = {}
+    for (prompt, model, status), (seconds, count) in metrics.LLM_CALL_SECONDS.totals().items():
+        entry = report.setdefault(f"{prompt}|{model}", {"calls": 0, "errors": 0, "seconds": 0.0,
+                                                          "prompt_tokens": 0, "completion_tokens": 0})
+        entry["calls"] += count
+        entry["seconds"] += seconds
+        if status == "error":
+            entry["errors"] += count
+    for (prompt, model, kind), tokens in metrics.LLM_TOKENS.totals().items():
+        entry = report.get(f"{prompt}|{model}")
+        if entry is not None:
+            entry[f"{kind}_tokens"] += tokens
+    for entry in report.values():
+        entry["mean_seconds"] = round(entry.pop("seconds") / entry["calls"], 3)
+        entry["mean_completion_tokens"] = round(entry["completion_tokens"] / entry["calls"], 1)
+    return report
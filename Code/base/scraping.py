@@ -2,40 +2,32 @@
 # brew install tesseract
 import re
 import os
+import time
 import tempfile
-import pdfplumber
-import pytesseract
-import pathlib
-from pdf2image import convert_from_path
-from PIL import Image
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+# fitz, pytesseract, pdf2image and PIL are imported where OCR needs them, keeping app start-up light
+from Code.base.cache import content_key, file_sha256, get_extract_cache
+from Code.base import metrics
+from Code.base import pdf_backends
+from Code.base import patent_parser
+from Code.base.patent_parser import INID_CODES, TEXT_SECTIONS
 
 # ---- AWS-friendly knobs (set via env vars, defaults are safe) ----
-TAIL_TEXT_PAGES = int(os.getenv("TAIL_TEXT_PAGES", "20"))    # last N pages to try with pdfplumber
+TAIL_TEXT_PAGES = int(os.getenv("TAIL_TEXT_PAGES", "20"))    # last N pages to try for embedded text
 TAIL_OCR_PAGES = int(os.getenv("TAIL_OCR_PAGES", "20"))     # last N pages to OCR if needed
 OCR_DPI = int(os.getenv("OCR_DPI", "200"))           # 300 is heavy on EC2
+OCR_MAX_SIDE_PX = int(os.getenv("OCR_MAX_SIDE_PX", "2400"))  # oversized sheets render at a lower DPI so the long side fits
+OCR_MIN_DPI = int(os.getenv("OCR_MIN_DPI", "100"))   # ...but never below this
+OCR_RENDERER = os.getenv("OCR_RENDERER", "pymupdf")  # "pymupdf" (in-memory pixmap per page) or "poppler" (pdf2image JPEGs)
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "gray")  # "gray", "binary" (threshold to black/white) or "none"
+OCR_BINARY_THRESHOLD = int(os.getenv("OCR_BINARY_THRESHOLD", "180"))  # 0-255; lighter pixels become white
 OCR_TIMEOUT = int(os.getenv("OCR_TIMEOUT", "25"))        # seconds per page
 OCR_LANG = os.getenv("OCR_LANG", "eng")
-
-# Common INID code patterns for metadata
-INID_CODES = {
-    'title': r'\(54\)\s*(.*)',
-    'abstract': r'\(57\)\s*(.*)',
-    'patent_number': r'\(11\)\s*(.*)',
-    'application_number': r'\(21\)\s*(.*)',
-    'priority_claim': r'\(30\)\s*(.*?)(?:\n\(|$)',
-    'issue_date': r'\(45\)\s*(.*)',
-    'inventor': r'\(72\)\s*(.*)',
-    'assignee': r'\(71\)\s*(.*)',
-}
-
-# Free-text section headings (these vary by patent)
-TEXT_SECTIONS = {
-    'Background of the Invention': ["BACKGROUND", "BACKGROUND OF THE INVENTION"],
-    'Summary of the Invention': ["SUMMARY", "SUMMARY OF THE INVENTION"],
-    'Brief Description of the Invention': ["BRIEF DESCRIPTION OF THE INVENTION"],
-    'Brief Description of the Figures': ["BRIEF DESCRIPTION OF THE DRAWINGS", "BRIEF DESCRIPTION OF THE FIGURES"],
-    'Detailed Description of the Invention': ["DETAILED DESCRIPTION", "DETAILED DESCRIPTION OF THE INVENTION"]
-}
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "claims_first")  # "claims_first" (scan back to claim 1) or "tail"
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(min(4, os.cpu_count() or 1))))  # OCR processes; 1 = inline
 
 def remove_line_numbers(text):
     """Remove line numbers from patent text."""
@@ -43,110 +35,242 @@ def remove_line_numbers(text):
 
 def extract_inid_metadata(first_page_text):
     """Extract metadata using INID codes (wonky with page 1 misalignment)"""
-    data = {}
-    for key, pattern in INID_CODES.items():
-        m = re.search(pattern, first_page_text)
-        data[key] = m.group(1).strip() if m else ''
-    return data
+    return patent_parser.parse(first_page_text).metadata()
 
 def extract_text_sections(full_text: str):
-    """Extract relevant sections from the text"""
-    # Normalize spacing, capture and split headers
-    text = re.sub(r'\s+', ' ', full_text)
-    section_patterns = []
-    for canon, variants in TEXT_SECTIONS.items():
-        for v in variants:
-            section_patterns.append(re.escape(v))
-    section_regex = r'(' + '|'.join(section_patterns) + r')'
-    parts = re.split(section_regex, text)
-
-    # Extract text
-    sections = {}
-    current_header = None
-    for part in parts:
-        if not part.strip():
-            continue
-        # If part is a header
-        for canon, variants in TEXT_SECTIONS.items():
-            if part.upper() in [v.upper() for v in variants]:
-                current_header = canon
-                sections[current_header] = ""
-                break
-        else:
-            # Otherwise, treat as body text
-            if current_header:
-                sections[current_header] += part.strip() + " "
+    """Extract relevant sections from the text (whitespace collapsed)"""
+    return patent_parser.parse(full_text).section_texts()
 
-    # Strip trailing spaces
-    return {k: v.strip() for k, v in sections.items()}
-        
+CLAIM_ONE_RE = re.compile(r'\n\s*1\.\s+')
 
 def extract_claims(full_text):
     """Find the last '1.' numbered list and grab until end."""
-    text = remove_line_numbers(full_text)
-    matches = list(re.finditer(r'\n\s*1\.\s+', text))
+    # Leading newline: claim 1 may open the text (e.g. at the top of the first page scanned)
+    text = "\n" + remove_line_numbers(full_text)
+    matches = list(CLAIM_ONE_RE.finditer(text))
     if not matches:
         return ""
     start_index = matches[-1].start()
     return text[start_index:].strip()
 
-def pdf_to_text_ocr(pdf_path: str, first_page: int, last_page: int) -> str:
+def split_claims(claims_text):
     """
-    Convert only a page range to text using OCR.
-    Uses paths_only=True so we don't keep all images in memory.
+    Split extracted claims into [(claim_number, text), ...].
+
+    Claim boundaries come from patent_parser, as for claims.parse_claims:
+    only the next expected number starts a claim, so "1." inside a claim
+    body or a stray "3." in a list doesn't.
     """
-    text_pages = []
-    with tempfile.TemporaryDirectory() as tempdir:
-        image_paths = convert_from_path(
+    # The parser looks for claim numbers at line starts
+    claims = patent_parser.parse("\n" + claims_text).claim_texts()
+    if not claims:
+        return [(None, claims_text.strip())] if claims_text.strip() else []
+    return claims
+
+def _preprocess(img, preprocess: str):
+    """Grayscale (or black/white) copy of a page image; line-art pages OCR faster without colour."""
+    if preprocess == "none":
+        return img
+    if img.mode != "L":
+        img = img.convert("L")
+    if preprocess == "binary":
+        threshold = OCR_BINARY_THRESHOLD
+        img = img.point(lambda v: 255 if v > threshold else 0, mode="1")
+    return img
+
+def _ocr_image(img, page_num: int, preprocess: str = OCR_PREPROCESS) -> str:
+    """OCR one rendered page image; timeouts and errors become inline markers."""
+    import pytesseract
+    try:
+        return pytesseract.image_to_string(
+            _preprocess(img, preprocess),
+            lang=OCR_LANG,
+            timeout=OCR_TIMEOUT,  # ✅ prevents hangs
+            config="--psm 6"
+        )
+    except RuntimeError:
+        # pytesseract timeout often raises RuntimeError
+        return f"\n[OCR TIMEOUT page {page_num} after {OCR_TIMEOUT}s]\n"
+    except pytesseract.TesseractError as e:
+        return f"\n[OCR ERROR page {page_num}]: {e}\n"
+
+def _ocr_image_file(img_path: str, page_num: int, preprocess: str = OCR_PREPROCESS) -> str:
+    from PIL import Image
+    with Image.open(img_path) as img:
+        return _ocr_image(img, page_num, preprocess)
+
+def _ocr_image_timed(img_path: str, page_num: int, preprocess: str = OCR_PREPROCESS):
+    """_ocr_image_file plus its duration, so pool workers can report per-page timings."""
+    start = time.perf_counter()
+    text = _ocr_image_file(img_path, page_num, preprocess)
+    return text, time.perf_counter() - start
+
+def _page_dpi(width_pt: float, height_pt: float) -> int:
+    """OCR_DPI, lowered for large sheets so the longer side stays within OCR_MAX_SIDE_PX."""
+    longest_in = max(width_pt, height_pt) / 72
+    if longest_in <= 0:
+        return OCR_DPI
+    return max(OCR_MIN_DPI, min(OCR_DPI, int(OCR_MAX_SIDE_PX / longest_in)))
+
+def _pixmap_image(page, preprocess: str):
+    """Rasterize a PyMuPDF page straight into a PIL image (grayscale unless preprocess is "none")."""
+    import fitz
+    from PIL import Image
+    dpi = _page_dpi(page.rect.width, page.rect.height)
+    gray = preprocess != "none"
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY if gray else fitz.csRGB, alpha=False)
+    return Image.frombytes("L" if gray else "RGB", (pix.width, pix.height), pix.samples)
+
+def _ocr_pdf_page(pdf_path: str, page_num: int, preprocess: str = OCR_PREPROCESS):
+    """
+    Render one 1-indexed page in memory and OCR it; returns (text, ocr seconds, render seconds).
+
+    Runs in the OCR pool workers, so only one page image per worker exists at a time.
+    """
+    import fitz
+    start = time.perf_counter()
+    with fitz.open(pdf_path) as doc:
+        img = _pixmap_image(doc[page_num - 1], preprocess)
+    # MuPDF keeps decoded scan images in a process-wide store (up to 256 MB); drop them with the page
+    fitz.TOOLS.store_shrink(100)
+    rendered = time.perf_counter()
+    text = _ocr_image(img, page_num, preprocess)
+    return text, time.perf_counter() - rendered, rendered - start
+
+def _record_ocr(page_num: int, text: str, seconds: float, render_seconds: float = None) -> str:
+    metrics.PAGES.inc(method="ocr")
+    if render_seconds is not None:
+        metrics.record("ocr_render", render_seconds, page=page_num)
+    metrics.record("ocr_page", seconds, page=page_num, error="[OCR " in text[:40])
+    return text
+
+_ocr_pools = {}
+_ocr_pools_lock = threading.Lock()
+
+def _get_ocr_pool(workers: int) -> ProcessPoolExecutor:
+    """Shared OCR process pool per size, so requests don't pay process start-up."""
+    with _ocr_pools_lock:
+        pool = _ocr_pools.get(workers)
+        if pool is None:
+            # spawn: forking a threaded web worker can deadlock in the child
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _ocr_pools[workers] = pool
+        return pool
+
+def _render_page(pdf_path: str, page_num: int, tempdir: str) -> str:
+    """Rasterize a single page to a JPEG in tempdir with poppler and return its path."""
+    from pdf2image import convert_from_path
+    with metrics.span("ocr_render", page=page_num):
+        return convert_from_path(
             pdf_path,
             dpi=OCR_DPI,
             output_folder=tempdir,
-            first_page=first_page,
-            last_page=last_page,
+            first_page=page_num,
+            last_page=page_num,
             fmt="jpeg",
             paths_only=True,   # ✅ keeps memory bounded
-            thread_count=2,
-        )
+        )[0]
 
-        for page_num, img_path in enumerate(image_paths, start=first_page):
-            try:
-                with Image.open(img_path) as img:
-                    page_text = pytesseract.image_to_string(
-                        img,
-                        lang=OCR_LANG,
-                        timeout=OCR_TIMEOUT,  # ✅ prevents hangs
-                        config="--psm 6"
-                    )
-                text_pages.append(page_text)
-            except RuntimeError:
-                # pytesseract timeout often raises RuntimeError
-                text_pages.append(f"\n[OCR TIMEOUT page {page_num} after {OCR_TIMEOUT}s]\n")
-            except pytesseract.TesseractError as e:
-                text_pages.append(f"\n[OCR ERROR page {page_num}]: {e}\n")
+def pdf_to_text_ocr(pdf_path: str, first_page: int, last_page: int, workers: int = None) -> str:
+    """
+    Convert only a page range to text using OCR.
+
+    With OCR_RENDERER=pymupdf each page is rendered in memory and recognized
+    before the next one is rendered (in the pool workers when workers > 1),
+    so no images touch the disk and at most one page image per worker is
+    alive. OCR_RENDERER=poppler keeps the pdf2image path: JPEGs in a temp
+    dir, written all at once when workers <= 1 and page by page into the
+    pool otherwise. Output keeps page order.
+    """
+    workers = OCR_WORKERS if workers is None else workers
+    with tempfile.TemporaryDirectory() as tempdir:
+        if workers <= 1 and OCR_RENDERER == "poppler":
+            from pdf2image import convert_from_path
+            with metrics.span("ocr_render", pages=last_page - first_page + 1):
+                image_paths = convert_from_path(
+                    pdf_path,
+                    dpi=OCR_DPI,
+                    output_folder=tempdir,
+                    first_page=first_page,
+                    last_page=last_page,
+                    fmt="jpeg",
+                    paths_only=True,   # ✅ keeps memory bounded
+                    thread_count=2,
+                )
+            text_pages = [
+                _record_ocr(page_num, *_ocr_image_timed(img_path, page_num, OCR_PREPROCESS))
+                for page_num, img_path in enumerate(image_paths, start=first_page)
+            ]
+        else:
+            text_pages = _ocr_pages(pdf_path, range(first_page, last_page + 1), workers, tempdir)
 
     return "\n".join(text_pages)
 
-def get_pdf_text(pdf_path: str) -> str:
+def _discard_ocr_pool(workers: int, pool: ProcessPoolExecutor):
+    """Drop a broken pool from the cache so the next call builds a fresh one."""
+    with _ocr_pools_lock:
+        if _ocr_pools.get(workers) is pool:
+            del _ocr_pools[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _run_in_ocr_pool(workers: int, fn, page_nums, make_args) -> list:
     """
-    Tail-first extraction:
-    - Cache to .tail.txt
-    - Try embedded text from last TAIL_TEXT_PAGES pages
-    - If empty, OCR only last TAIL_OCR_PAGES pages
+    fn(*make_args(n)) for every page on the shared pool, in page order.
+
+    If a worker died (e.g. OOM-killed on a large scan) the pool is broken for
+    good, so it is replaced and the pages are retried once.
     """
-    pdf_path = str(pdf_path)
-    txt_path = pathlib.Path(pdf_path).with_suffix(".tail.txt")
-
-    # Determine total pages
-    with pdfplumber.open(pdf_path) as pdf:
-        total_pages = len(pdf.pages)
-
-    # 1) Fast: extract embedded text from tail pages
-    start_text_page = max(0, total_pages - TAIL_TEXT_PAGES)
-    embedded_chunks = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for i in range(start_text_page, total_pages):
-            embedded_chunks.append(pdf.pages[i].extract_text() or "")
+    for attempt in range(2):
+        pool = _get_ocr_pool(workers)
+        try:
+            futures = [pool.submit(fn, *make_args(n)) for n in page_nums]
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            _discard_ocr_pool(workers, pool)
+            if attempt:
+                raise
+            print(f"[WARN] OCR worker died; restarting the pool of {workers} and retrying {len(page_nums)} page(s)")
+
+def _ocr_pages(pdf_path: str, page_nums, workers: int, tempdir: str) -> list:
+    """Render and OCR the given 1-indexed pages, through the pool when workers > 1."""
+    if OCR_RENDERER != "poppler":
+        if workers <= 1:
+            return [_record_ocr(n, *_ocr_pdf_page(pdf_path, n, OCR_PREPROCESS)) for n in page_nums]
+        outputs = _run_in_ocr_pool(workers, _ocr_pdf_page, page_nums, lambda n: (pdf_path, n, OCR_PREPROCESS))
+        return [_record_ocr(n, *output) for n, output in zip(page_nums, outputs)]
+    if workers <= 1:
+        return [_record_ocr(n, *_ocr_image_timed(_render_page(pdf_path, n, tempdir), n, OCR_PREPROCESS)) for n in page_nums]
+    images = {}
+
+    def image_args(n):
+        # Rendered while earlier pages OCR; a retry reuses the images
+        if n not in images:
+            images[n] = _render_page(pdf_path, n, tempdir)
+        return images[n], n, OCR_PREPROCESS
+
+    # Images live in tempdir, so collect everything before it is removed
+    outputs = _run_in_ocr_pool(workers, _ocr_image_timed, page_nums, image_args)
+    return [_record_ocr(n, *output) for n, output in zip(page_nums, outputs)]
+
+def _extraction_key(content_hash):
+    """Cache key: PDF bytes plus every setting that changes the extracted text."""
+    return content_key("pdf_text", content_hash, EXTRACTION_MODE, pdf_backends.PDF_BACKEND, pdf_backends.PDF_FALLBACK, TAIL_TEXT_PAGES, TAIL_OCR_PAGES, OCR_DPI, OCR_LANG,
+                       OCR_RENDERER, OCR_PREPROCESS, OCR_BINARY_THRESHOLD, OCR_MAX_SIDE_PX, OCR_MIN_DPI)
+
+def _has_claim_one(page_text: str) -> bool:
+    """True if the page contains the start of claim 1 (same test as extract_claims)."""
+    return CLAIM_ONE_RE.search("\n" + remove_line_numbers(page_text)) is not None
+
+def _extract_tail(pdf_path: str, stats: dict) -> str:
+    """Embedded text of the last TAIL_TEXT_PAGES pages, OCR of the last TAIL_OCR_PAGES if empty."""
+    # 1) Fast: extract embedded text from tail pages (single open)
+    with pdf_backends.open_document(pdf_path) as doc:
+        total_pages = doc.page_count
+        start_text_page = max(0, total_pages - TAIL_TEXT_PAGES)
+        embedded_chunks = [doc.page_text(i) for i in range(start_text_page, total_pages)]
+        stats["pages_fallback"] = doc.fallback_pages
     full_text = "\n".join(embedded_chunks)
+    stats.update(total_pages=total_pages, pages_embedded=len(embedded_chunks))
 
     # 2) If basically empty, OCR only the tail pages
     if len(full_text.strip()) < 50:
@@ -157,7 +281,100 @@ def get_pdf_text(pdf_path: str) -> str:
             f"Using OCR pages {first_ocr_page}-{last_ocr_page} (dpi={OCR_DPI})..."
         )
         full_text = pdf_to_text_ocr(pdf_path, first_page=first_ocr_page, last_page=last_ocr_page)
+        stats["pages_ocr"] = last_ocr_page - first_ocr_page + 1
+
+    stats["pages_touched"] = max(stats["pages_embedded"], stats["pages_ocr"])
+    stats["claims_found"] = _has_claim_one(full_text)
+    return full_text
+
+def _extract_claims_first(pdf_path: str, stats: dict) -> str:
+    """
+    Scan pages backwards from the end and stop at the page holding claim 1.
+
+    Pages are read in windows of OCR_WORKERS pages so that pages without
+    embedded text can be OCR'd in parallel; only those pages are OCR'd, and
+    at most TAIL_OCR_PAGES of them. Gives up after TAIL_TEXT_PAGES pages and
+    returns everything scanned, like tail mode.
+    """
+    window = max(1, OCR_WORKERS)
+    pages = {}
+    with pdf_backends.open_document(pdf_path) as doc, tempfile.TemporaryDirectory() as tempdir:
+        total_pages = doc.page_count
+        stop_page = max(0, total_pages - TAIL_TEXT_PAGES)
+        stats["total_pages"] = total_pages
+
+        page = total_pages - 1
+        while page >= stop_page and not stats["claims_found"]:
+            batch = list(range(page, max(stop_page, page - window + 1) - 1, -1))
+            page = batch[-1] - 1
+
+            texts = {}
+            needs_ocr = []
+            for i in batch:
+                texts[i] = doc.page_text(i)
+                stats["pages_embedded"] += 1
+                if len(texts[i].strip()) < 50 and stats["pages_ocr"] < TAIL_OCR_PAGES:
+                    needs_ocr.append(i)
+            needs_ocr = needs_ocr[:TAIL_OCR_PAGES - stats["pages_ocr"]]
+            if needs_ocr:
+                ocr_texts = _ocr_pages(pdf_path, [i + 1 for i in needs_ocr], OCR_WORKERS, tempdir)
+                texts.update(zip(needs_ocr, ocr_texts))
+                stats["pages_ocr"] += len(needs_ocr)
+
+            # Newest page first; keep everything up to and including claim 1
+            for i in batch:
+                pages[i] = texts[i]
+                if _has_claim_one(texts[i]):
+                    stats["claims_found"] = True
+                    break
+            stats["pages_touched"] += len(batch)
+        stats["pages_fallback"] = doc.fallback_pages
+
+    if not stats["claims_found"]:
+        print(f"[INFO] Claim 1 not found in last {len(pages)} pages of {pdf_path}.")
+    return "\n".join(pages[i] for i in sorted(pages))
+
+def get_pdf_text(pdf_path: str, stats: dict = None, content_hash: str = None) -> str:
+    """
+    Tail-first extraction:
+    - Return cached text for this PDF content + settings, if any
+    - Embedded text comes from PDF_BACKEND (PyMuPDF by default), falling
+      back per page to PDF_FALLBACK when it is empty or garbled
+    - EXTRACTION_MODE=claims_first: walk back from the last page, OCR-ing
+      only pages without embedded text, until the page with claim 1
+    - EXTRACTION_MODE=tail: embedded text from last TAIL_TEXT_PAGES pages,
+      OCR of the last TAIL_OCR_PAGES pages if that is empty
+
+    If stats is given it is filled with per-document page counters
+    (pages_touched, pages_skipped, pages_embedded, pages_fallback, pages_ocr, ...).
+    Pass content_hash (SHA-256 of the file) when it is already known to
+    skip re-hashing the PDF.
+    """
+    pdf_path = str(pdf_path)
+    stats = stats if stats is not None else {}
+    stats.update(mode=EXTRACTION_MODE, cached=False, total_pages=0, pages_touched=0,
+                 pages_skipped=0, pages_embedded=0, pages_fallback=0, pages_ocr=0, claims_found=False)
+
+    cache = get_extract_cache()
+    cache_key = _extraction_key(content_hash or file_sha256(pdf_path)) if cache is not None else None
+    if cache is not None:
+        cached = cache.get(cache_key)
+        metrics.CACHE_LOOKUPS.inc(cache="extract", result="miss" if cached is None else "hit")
+        if cached is not None:
+            stats["cached"] = True
+            return cached
+
+    if EXTRACTION_MODE == "tail":
+        full_text = _extract_tail(pdf_path, stats)
+    else:
+        full_text = _extract_claims_first(pdf_path, stats)
+    stats["pages_skipped"] = stats["total_pages"] - stats["pages_touched"]
+    print(
+        f"[INFO] {os.path.basename(pdf_path)}: touched {stats['pages_touched']}/{stats['total_pages']} pages "
+        f"(ocr={stats['pages_ocr']}, skipped={stats['pages_skipped']}, mode={EXTRACTION_MODE})"
+    )
 
-    # Save cache
-    txt_path.write_text(full_text, encoding="utf-8")
-    return full_text
\ No newline at end of file
+    # Save cache (skip results that hit OCR timeouts/errors so they get retried)
+    if cache is not None and "[OCR TIMEOUT page" not in full_text and "[OCR ERROR page" not in full_text:
+        cache.set(cache_key, full_text)
+    return full_text
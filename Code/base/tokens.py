@@ -0,0 +1,72 @@
+import os
+import threading
+
+# ---- Token budget knobs (set via env vars) ----
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "32768"))           # model context window
+LLM_MIN_COMPLETION_TOKENS = int(os.getenv("LLM_MIN_COMPLETION_TOKENS", "1024"))  # reserved for the answer
+TOKEN_SAFETY = float(os.getenv("TOKEN_SAFETY", "1.15"))  # tiktoken is not the Llama tokenizer; over-estimate
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+def _get_encoding():
+    """tiktoken encoding, or False if it can't be loaded (e.g. no network for the BPE file)."""
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+            except Exception as e:
+                print(f"[WARN] tiktoken unavailable ({type(e).__name__}); estimating tokens as chars/4")
+                _encoding = False
+        return _encoding
+
+def count_tokens(text: str) -> int:
+    """Estimated prompt tokens for text, padded by TOKEN_SAFETY."""
+    encoding = _get_encoding()
+    raw = len(encoding.encode(text, disallowed_special=())) if encoding else (len(text) + 3) // 4
+    return int(raw * TOKEN_SAFETY) + 1
+
+def completion_budget(prompt_tokens: int, max_tokens: int, context_tokens: int = None) -> int:
+    """max_tokens capped to what is left of the context window after the prompt."""
+    context_tokens = context_tokens or LLM_CONTEXT_TOKENS
+    return max(1, min(max_tokens, context_tokens - prompt_tokens))
+
+def plan_chunks(claims, overhead_tokens: int, context_tokens: int = None, ancestors=None):
+    """
+    Group [(claim_number, text), ...] into chunks that fit the context window.
+
+    Each chunk leaves room for overhead_tokens (instructions and framing) and
+    LLM_MIN_COMPLETION_TOKENS of answer. Claims are never split; a single
+    claim that is too large on its own gets a chunk to itself. ancestors
+    ({claim_number: [claim numbers]}) are the claims the caller sends along
+    with a claim for context; those not already in the chunk count against
+    its budget but are not part of the returned chunk.
+
+    Returns:
+        list: [[(claim_number, text), ...], ...]; one chunk if everything fits.
+    """
+    context_tokens = context_tokens or LLM_CONTEXT_TOKENS
+    budget = max(1, context_tokens - overhead_tokens - LLM_MIN_COMPLETION_TOKENS)
+    sizes = {number: count_tokens(text + "\n\n") for number, text in claims}
+    ancestors = ancestors or {}
+
+    def cost(number, present):
+        return sizes[number] + sum(sizes[n] for n in ancestors.get(number, ()) if n in sizes and n not in present)
+
+    chunks, current, present, used = [], [], set(), 0
+    for claim in claims:
+        size = cost(claim[0], present)
+        if current and used + size > budget:
+            chunks.append(current)
+            current, present, used = [], set(), 0
+            size = cost(claim[0], present)
+        current.append(claim)
+        present.add(claim[0])
+        present.update(ancestors.get(claim[0], ()))
+        used += size
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,147 @@
+import os
+import re
+import time
+import hashlib
+import tempfile
+
+# ---- Upload knobs (set via env vars) ----
+UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploads")
+UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", "50"))            # per file
+UPLOAD_QUOTA_MB = int(os.getenv("UPLOAD_QUOTA_MB", "2048"))      # total for stored uploads; oldest evicted first
+UPLOAD_MIN_AGE = int(os.getenv("UPLOAD_MIN_AGE", "3600"))        # seconds; never evict files used more recently
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Stored uploads are named by content hash; only these are ever evicted
+_STORED_RE = re.compile(r'^[0-9a-f]{64}\.pdf$')
+
+
+class UploadTooLarge(ValueError):
+    """The upload exceeded UPLOAD_MAX_MB."""
+
+
+class StoredUpload:
+    """A content-addressed upload on disk."""
+    __slots__ = ("path", "sha256", "size", "filename", "existed")
+
+    def __init__(self, path, sha256, size, filename, existed):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.filename = filename
+        self.existed = existed
+
+
+class UploadWriter:
+    """
+    Writable sink that hashes an upload into a temp file in `folder` as the
+    bytes arrive; commit() then stores it as <sha256>.pdf.
+
+    app.py hands one to Werkzeug's multipart parser per file part, so a form
+    upload is written to disk once instead of being spooled and copied.
+    Past max_bytes the data is dropped and commit() raises UploadTooLarge
+    (raising from write() would be swallowed by the form parser). Closing
+    an uncommitted writer deletes its temp file.
+    """
+
+    def __init__(self, folder=None, max_bytes=None):
+        self.folder = folder or UPLOAD_FOLDER
+        self.max_bytes = max_bytes or UPLOAD_MAX_MB * 1024 * 1024
+        os.makedirs(self.folder, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=self.folder, prefix=".upload-", suffix=".part")
+        self.file = os.fdopen(fd, "wb")
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.too_large = False
+
+    def write(self, chunk):
+        if self.too_large:
+            return len(chunk)
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            self.too_large = True
+            self.close()
+            return len(chunk)
+        self.digest.update(chunk)
+        self.file.write(chunk)
+        return len(chunk)
+
+    def seek(self, offset, whence=0):
+        # The form parser rewinds finished parts; nothing is read back from the sink
+        return 0
+
+    def commit(self, filename=None):
+        """Store the upload under its content hash and return a StoredUpload."""
+        if self.too_large:
+            raise UploadTooLarge(f"Upload exceeds {self.max_bytes // (1024 * 1024)} MB")
+        try:
+            self.file.close()
+            sha = self.digest.hexdigest()
+            path = os.path.join(self.folder, f"{sha}.pdf")
+            existed = os.path.exists(path)
+            # Same bytes either way; the rename also marks the file recently used for eviction,
+            # and can't fail if a concurrent eviction removed the old copy
+            os.replace(self.tmp_path, path)
+        finally:
+            self.close()
+        enforce_quota(self.folder, keep=path)
+        return StoredUpload(os.path.abspath(path), sha, self.size, filename, existed)
+
+    def close(self):
+        self.file.close()
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def ingest(stream, filename=None, folder=None, max_bytes=None):
+    """
+    Stream an upload to disk in fixed-size chunks, hashing as it goes.
+
+    The body lands in a temp file in `folder` and is then renamed to
+    <sha256>.pdf, so identical PDFs share one stored copy and concurrent
+    uploads never overwrite each other's files. A re-upload replaces the
+    stored copy, refreshing its mtime. Raises UploadTooLarge past max_bytes.
+    """
+    writer = UploadWriter(folder, max_bytes)
+    try:
+        for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b""):
+            writer.write(chunk)
+            if writer.too_large:
+                break
+        return writer.commit(filename)
+    finally:
+        writer.close()
+
+
+def enforce_quota(folder=None, quota_bytes=None, keep=None):
+    """Delete least-recently-used stored uploads until the folder is under quota; returns bytes freed."""
+    folder = folder or UPLOAD_FOLDER
+    quota_bytes = quota_bytes if quota_bytes is not None else UPLOAD_QUOTA_MB * 1024 * 1024
+
+    entries = []
+    for entry in os.scandir(folder):
+        if entry.is_file() and _STORED_RE.match(entry.name):
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue   # evicted by a concurrent request
+            entries.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+
+    freed = 0
+    cutoff = time.time() - UPLOAD_MIN_AGE
+    for mtime, size, path in sorted(entries):
+        if total <= quota_bytes:
+            break
+        if mtime > cutoff or (keep and os.path.abspath(path) == os.path.abspath(keep)):
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        total -= size
+        freed += size
+    if freed:
+        print(f"[INFO] evicted {freed / (1024 * 1024):.1f} MB of old uploads from {folder}")
+    return freed
@@ -0,0 +1,201 @@
+"""
+Batch analysis of many patents: python -m Code.batch <dir-or-manifest> --out results.jsonl
+
+Extraction (PDF text, OCR) runs on a process pool; the rest of
+pipeline.run_pipeline (claims, pre-screen, LLM analysis) runs on a separate
+thread pool, so OCR-heavy documents don't hold up LLM calls and vice versa.
+Each finished document is appended to the JSONL output right away with
+status "done", "partial" (some categories' LLM calls failed) or "failed"
+(every call failed, or extraction did); re-running with the same --out
+skips only documents (by content hash) that already have a "done" record.
+
+A manifest is a text file with one PDF path per line, or a .jsonl file with
+a "path" field per line; relative paths are resolved against the manifest.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from Code.base.cache import file_sha256
+
+
+def _init_extract_worker():
+    # Documents are already spread across processes; OCR each one inline
+    from Code.base import scraping
+    scraping.OCR_WORKERS = 1
+
+def _extract(pdf_path, sha):
+    """Runs in an extraction process: PDF -> text plus counters."""
+    from Code.base.scraping import get_pdf_text
+    start = time.perf_counter()
+    stats = {}
+    text = get_pdf_text(pdf_path, stats=stats, content_hash=sha)
+    return text, stats, round(time.perf_counter() - start, 3)
+
+def _analyze(path, sha, text, stats, settings):
+    """Runs on the LLM thread pool: extracted text -> run_pipeline output plus claims chars."""
+    from Code.base.pipeline import run_pipeline
+    claims = {}
+
+    def on_stage(stage, seconds, info):
+        if stage == "claims":
+            claims.update(info)
+
+    out = run_pipeline(path, settings=settings, content_hash=sha, patent_text=text, extraction=stats, on_stage=on_stage)
+    return out, claims.get("chars", 0)
+
+def _status(out):
+    """"failed" when every LLM call failed, "partial" when some did, else "done"."""
+    if not out["failed"]:
+        return "done"
+    return "failed" if len(out["failed"]) == len(out["attempted"]) else "partial"
+
+
+def collect_inputs(source, suffix=".pdf", recursive=False):
+    """PDF paths from a directory or a manifest file."""
+    if os.path.isdir(source):
+        paths = []
+        for root, dirs, files in os.walk(source):
+            paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(suffix))
+            if not recursive:
+                break
+        return sorted(paths)
+
+    base = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            path = json.loads(line)["path"] if source.endswith(".jsonl") else line
+            paths.append(path if os.path.isabs(path) else os.path.join(base, path))
+    return paths
+
+def load_done(out_path):
+    """Content hashes of documents already finished in a previous run."""
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue   # half-written line from an interrupted run
+            if record.get("status") == "done":
+                done.add(record["sha256"])
+    return done
+
+
+def run_batch(paths, out_path, settings, extract_workers, llm_workers):
+    done = load_done(out_path)
+    todo, queued, unreadable = [], set(), []
+    duplicates = 0
+    for path in paths:
+        try:
+            sha = file_sha256(path)
+        except OSError as e:
+            # Missing or unreadable entry: record it below instead of aborting the batch
+            unreadable.append((path, e))
+            continue
+        if sha in queued:
+            duplicates += 1
+        elif sha not in done:
+            todo.append((path, sha))
+            queued.add(sha)
+    skipped = len(paths) - len(todo) - len(unreadable)
+    print(f"[INFO] {len(paths)} document(s): {skipped - duplicates} already done, "
+          f"{duplicates} duplicate(s), {len(unreadable)} unreadable, {len(todo)} to run")
+
+    counts = {"done": 0, "partial": 0, "failed": 0}
+    totals = {"extract_seconds": 0.0, "analyze_seconds": 0.0}
+    start = time.perf_counter()
+
+    def write(record):
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        os.fsync(out.fileno())
+        counts[record["status"]] += 1
+        finished = sum(counts.values())
+        print(f"[{finished}/{len(todo) + len(unreadable)}] {record['status']:<7} {record['path']}"
+              + (f" ({record['error']})" if record.get("error") else ""))
+
+    ctx = multiprocessing.get_context("spawn")
+    with open(out_path, "a", encoding="utf-8") as out, \
+         ProcessPoolExecutor(max_workers=extract_workers, mp_context=ctx, initializer=_init_extract_worker) as extract_pool, \
+         ThreadPoolExecutor(max_workers=llm_workers, thread_name_prefix="batch-llm") as llm_pool:
+
+        for path, e in unreadable:
+            write({"path": path, "sha256": None, "status": "failed", "stage": "hash", "error": f"{type(e).__name__}: {e}"})
+
+        stage = {extract_pool.submit(_extract, path, sha): ("extract", path, sha, None) for path, sha in todo}
+        while stage:
+            finished, _ = wait(stage, return_when=FIRST_COMPLETED)
+            for future in finished:
+                kind, path, sha, extracted = stage.pop(future)
+                record = {"path": path, "sha256": sha}
+                try:
+                    if kind == "extract":
+                        text, stats, seconds = future.result()
+                        totals["extract_seconds"] += seconds
+                        next_future = llm_pool.submit(_analyze, path, sha, text, stats, settings)
+                        stage[next_future] = ("analyze", path, sha, seconds)
+                        continue
+                    analysis, claims_chars = future.result()
+                    totals["analyze_seconds"] += analysis["timings"].get("analyze", 0.0)
+                    record.update(
+                        status=_status(analysis),
+                        timings={"extract": extracted, **analysis["timings"]},
+                        extraction=analysis["extraction"],
+                        claims_chars=claims_chars,
+                        results=analysis["results"],
+                    )
+                    if analysis["failed"]:
+                        record["error"] = f"{len(analysis['failed'])}/{len(analysis['attempted'])} categories failed"
+                        record["failed_prompts"] = analysis["failed"]
+                except Exception as e:
+                    record.update(status="failed", stage=kind, error=f"{type(e).__name__}: {e}")
+                write(record)
+
+    elapsed = time.perf_counter() - start
+    rate = counts["done"] / (elapsed / 60) if elapsed else 0.0
+    print(
+        f"[INFO] done={counts['done']} partial={counts['partial']} failed={counts['failed']} skipped={skipped} "
+        f"in {elapsed:.1f}s -> {rate:.2f} docs/min "
+        f"(extract {totals['extract_seconds']:.1f}s, analyze {totals['analyze_seconds']:.1f}s summed across workers)"
+    )
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m Code.batch", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="directory of PDFs, or a manifest (.txt paths / .jsonl with 'path')")
+    parser.add_argument("--out", default="batch_results.jsonl", help="JSONL results file (appended, used to resume)")
+    parser.add_argument("--extract-workers", type=int, default=os.cpu_count() or 1,
+                        help="processes for PDF extraction/OCR (default: CPU count)")
+    parser.add_argument("--llm-workers", type=int, default=4,
+                        help="documents analyzed by the LLM at once (default: 4)")
+    parser.add_argument("--recursive", action="store_true", help="descend into subdirectories")
+    args = parser.parse_args(argv)
+
+    from Code.base.pipeline import MissingAPIKey, llm_settings
+    try:
+        settings = llm_settings()
+    except MissingAPIKey as e:
+        parser.error(str(e))
+
+    paths = collect_inputs(args.source, recursive=args.recursive)
+    if not paths:
+        parser.error(f"no PDFs found in {args.source}")
+    counts = run_batch(paths, args.out, settings, max(1, args.extract_workers), max(1, args.llm_workers))
+    return 1 if counts["failed"] or counts["partial"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""
+Wall-clock latency of analyze_claims, sequential vs concurrent.
+
+Runs all PROMPTS against the local stub server with a fixed per-call latency.
+Sequential time should be about len(PROMPTS) * latency; concurrent time
+should be close to a single call.
+
+    python -m Code.benchmarks.bench_analyze_concurrency --latency 0.5
+"""
+import argparse
+import time
+
+from Code.base.openai_prompts import PROMPTS
+from Code.base.patent_logic import analyze_claims
+from Code.benchmarks.stub_openai import StubServer
+
+CLAIMS = "\n1. A method comprising: receiving a document; and parsing the document.\n"
+
+
+def run(api_base, max_workers):
+    start = time.perf_counter()
+    results = analyze_claims(
+        claims_text = CLAIMS,
+        model       = "stub-model",
+        role        = "user",
+        api_key     = "stub",
+        api_base    = api_base,
+        temperature = 0.1,
+        top_p       = 1.0,
+        max_tokens  = 256,
+        max_workers = max_workers,
+        use_cache   = False,
+    )
+    elapsed = time.perf_counter() - start
+    errors = [k for k, v in results.items() if v.startswith("Error:")]
+    assert list(results) == list(PROMPTS), "result keys/order changed"
+    return elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.5, help="stub seconds per completion")
+    args = parser.parse_args()
+
+    with StubServer(latency=args.latency) as server:
+        print(f"{len(PROMPTS)} prompts, {args.latency:.2f}s per call")
+        for label, workers in (("sequential", 1), ("concurrent", len(PROMPTS))):
+            server.peak_inflight = 0
+            elapsed, errors = run(server.api_base, workers)
+            print(f"{label:>10}: {elapsed:6.2f}s  peak in-flight={server.peak_inflight}  errors={len(errors)}")
+
+
+if __name__ == "__main__":
+    main()
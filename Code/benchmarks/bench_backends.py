@@ -0,0 +1,78 @@
+"""
+Compare PDF text-extraction backends: time, peak RSS and extracted claims.
+
+Each backend runs in a fresh process over every page of every PDF in the
+directory, so peak RSS is not polluted by the other backend. Claims are
+compared with extract_claims, exactly and with whitespace collapsed.
+
+    python -m Code.benchmarks.bench_backends --dir Data/sample_patents
+
+The bundled sample patents are image-only scans, so on those both backends
+return no text; point --dir at text-layer PDFs for a meaningful comparison.
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import resource
+import time
+
+SAMPLES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "Data", "sample_patents"))
+
+
+def _extract_all(backend_name, pdfs, queue):
+    from Code.base.pdf_backends import BACKENDS
+    from Code.base.scraping import extract_claims
+
+    start = time.perf_counter()
+    claims, pages = {}, 0
+    for pdf_path in pdfs:
+        doc = BACKENDS[backend_name](pdf_path)
+        try:
+            text = "\n".join(doc.page_text(i) for i in range(doc.page_count))
+            pages += doc.page_count
+        finally:
+            doc.close()
+        claims[pdf_path] = extract_claims(text)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, pages, peak_kb, claims))
+
+
+def run_backend(backend_name, pdfs):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_extract_all, args=(backend_name, pdfs, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=SAMPLES_DIR, help="directory of PDFs")
+    parser.add_argument("--backends", nargs="+", default=["pymupdf", "pdfplumber"])
+    args = parser.parse_args()
+
+    pdfs = sorted(glob.glob(os.path.join(args.dir, "*.pdf")))
+    print(f"{len(pdfs)} PDFs from {args.dir}")
+
+    results = {}
+    for name in args.backends:
+        elapsed, pages, peak_kb, claims = run_backend(name, pdfs)
+        results[name] = claims
+        print(f"{name:>10}: {elapsed:7.2f}s  {pages / elapsed:7.1f} pages/sec  peak RSS {peak_kb / 1024:6.1f} MB")
+
+    base_name, *others = args.backends
+    for name in others:
+        for pdf_path in pdfs:
+            a, b = results[base_name][pdf_path], results[name][pdf_path]
+            exact = a == b
+            normalized = " ".join(a.split()) == " ".join(b.split())
+            print(f"{os.path.basename(pdf_path):>28}  {base_name} vs {name}: "
+                  f"exact={exact} whitespace-normalized={normalized} chars={len(a)}/{len(b)}")
+
+
+if __name__ == "__main__":
+    main()
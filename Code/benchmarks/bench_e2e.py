@@ -0,0 +1,294 @@
+"""
+End-to-end /analyze benchmark and regression check, fully offline.
+
+Starts the local stub server (latency, token rates, 429 injection; see
+stub_openai.py), points the app at it and posts PDFs to /analyze (or
+/analyze/stream with --stream) through the Flask test client from N client
+threads at each concurrency level. Reports p50/p95/p99 latency, throughput,
+peak RSS of this process plus its OCR workers, and how time splits between
+extraction/OCR and the LLM (from the per-stage metrics).
+
+Caches are disabled and point at a temp dir unless --warm is given.
+--save-baseline writes the report to baseline.json; later runs with the
+same configuration are compared against it and exit 1 on a regression.
+
+Only stub-bound figures are compared, since they don't depend on the
+machine: the LLM (analyze) seconds per document and LLM requests per
+document beyond --tolerance, and any new failures. Latency, throughput and
+the extraction/OCR split are CPU-bound and only reported. The committed
+baseline.json is for the synthetic run, which needs no OCR and is the
+regression check:
+
+    python -m Code.benchmarks.bench_e2e --synthetic 4
+
+Other configurations (e.g. the scanned sample PDFs) are reported but not
+compared unless a baseline is saved for them with --save-baseline:
+
+    python -m Code.benchmarks.bench_e2e --concurrency 1 4 8
+    python -m Code.benchmarks.bench_e2e --synthetic 6 --throttle-rate 0.05 --stream
+"""
+import argparse
+import glob
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+
+import psutil
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Stages reported in the time split (see Code/base/metrics.py)
+SPLIT_STAGES = ("upload_save", "extract", "ocr_page", "claims", "prescreen", "analyze", "llm_call", "ratelimit_wait", "retry_backoff")
+
+
+def synthetic_pdfs(count, folder):
+    """Text PDFs with a short description and a claim set, distinct per document."""
+    import fitz
+    from Code.benchmarks.bench_parser import synthetic_patent
+    paths = []
+    for i in range(count):
+        text = synthetic_patent(paragraphs=40 + 10 * i, claims=10 + 2 * i).replace(
+            "(54) SYSTEM AND METHOD FOR ADJUSTING A WIDGET", f"(54) SYSTEM AND METHOD FOR ADJUSTING WIDGET {i}")
+        lines = [wrapped for line in text.splitlines() for wrapped in (textwrap.wrap(line, 110) or [""])]
+        doc = fitz.open()
+        for start in range(0, len(lines), 70):
+            doc.new_page().insert_text((40, 50), "\n".join(lines[start:start + 70]), fontsize=8)
+        path = os.path.join(folder, f"synthetic_{i}.pdf")
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+class RssSampler(threading.Thread):
+    """Peak resident memory of this process and its children (OCR pool), sampled every 50 ms."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.process = psutil.Process()
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def sample(self):
+        rss = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        self.peak = max(self.peak, rss)
+
+    def run(self):
+        while not self.stopped.wait(0.05):
+            self.sample()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.sample()
+        return self.peak
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))]
+
+def stage_totals():
+    from Code.base import metrics
+    return {key[0]: total for key, total in metrics.STAGE_SECONDS.totals().items()}
+
+def post_pdf(client, path, stream):
+    """One request; returns (ok, seconds, seconds to first result or None)."""
+    with open(path, "rb") as f:
+        data = {"patent": (io.BytesIO(f.read()), os.path.basename(path))}
+    start = time.perf_counter()
+    if not stream:
+        response = client.post("/analyze", data=data, content_type="multipart/form-data")
+        body = response.get_json(silent=True) or {}
+        ok = response.status_code == 200 and not any(
+            isinstance(v, str) and v.startswith("Error:") for v in body.values())
+        return ok, time.perf_counter() - start, None
+
+    response = client.post("/analyze/stream", data=data, content_type="multipart/form-data", buffered=False)
+    first, ok = None, response.status_code == 200
+    for chunk in response.response:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if first is None and "event: result" in text:
+            first = time.perf_counter() - start
+        if "event: error" in text:
+            ok = False
+        if "event: done" in text:
+            done = text.split("event: done", 1)[1].split("data: ", 1)[1].split("\n", 1)[0]
+            ok = ok and not json.loads(done)["failed"]
+    response.close()
+    return ok, time.perf_counter() - start, first
+
+def run_level(app, pdfs, concurrency, n_requests, stream):
+    todo = [pdfs[i % len(pdfs)] for i in range(n_requests)]
+    lock = threading.Lock()
+    latencies, firsts, failures = [], [], [0]
+
+    def client_loop():
+        client = app.test_client()
+        while True:
+            with lock:
+                if not todo:
+                    return
+                path = todo.pop()
+            ok, seconds, first = post_pdf(client, path, stream)
+            with lock:
+                latencies.append(seconds)
+                if first is not None:
+                    firsts.append(first)
+                if not ok:
+                    failures[0] += 1
+
+    before = stage_totals()
+    sampler = RssSampler()
+    sampler.start()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client_loop) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    peak_rss = sampler.stop()
+    after = stage_totals()
+
+    per_doc = {}
+    for stage in SPLIT_STAGES:
+        seconds = after.get(stage, (0.0, 0))[0] - before.get(stage, (0.0, 0))[0]
+        per_doc[stage] = round(seconds / n_requests, 4)
+    pipeline = per_doc["extract"] + per_doc["analyze"]
+    level = {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "failures": failures[0],
+        "wall_seconds": round(wall, 3),
+        "throughput_per_min": round(n_requests / wall * 60, 2),
+        "latency": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3),
+        },
+        "peak_rss_mb": round(peak_rss / 2 ** 20, 1),
+        "seconds_per_doc": per_doc,
+        "llm_share": round(per_doc["analyze"] / pipeline, 3) if pipeline else None,
+    }
+    if firsts:
+        level["first_result_p50"] = round(percentile(firsts, 50), 3)
+    return level
+
+def compare(report, baseline, tolerance):
+    """Regression messages for levels whose stub-bound figures got worse than tolerance allows."""
+    if baseline.get("config") != report["config"]:
+        return None
+    problems = []
+    old_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in report["levels"]:
+        old = old_levels.get(level["concurrency"])
+        if old is None:
+            continue
+        c = level["concurrency"]
+        analyze, old_analyze = level["seconds_per_doc"]["analyze"], old["seconds_per_doc"]["analyze"]
+        if analyze > old_analyze * (1 + tolerance):
+            problems.append(f"c={c}: analyze {old_analyze}s -> {analyze}s per document")
+        calls, old_calls = level["llm_requests"] / level["requests"], old["llm_requests"] / old["requests"]
+        if calls > old_calls * (1 + tolerance):
+            problems.append(f"c={c}: LLM requests {old_calls:.1f} -> {calls:.1f} per document")
+        if level["failures"] > old["failures"]:
+            problems.append(f"c={c}: failures {old['failures']} -> {level['failures']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", default=os.path.join(ROOT, "Data", "sample_patents", "*.pdf"), help="glob of PDFs to post")
+    parser.add_argument("--synthetic", type=int, default=0, help="generate N text PDFs instead of --pdfs (no OCR needed)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=0, help="requests per level (default: max(#pdfs, 2 x concurrency))")
+    parser.add_argument("--stream", action="store_true", help="use /analyze/stream and report time to first result")
+    parser.add_argument("--warm", action="store_true", help="keep the extraction and LLM caches enabled")
+    parser.add_argument("--latency", type=float, default=0.3, help="stub seconds to first token")
+    parser.add_argument("--tps", type=float, default=200.0, help="stub completion tokens per second")
+    parser.add_argument("--prompt-tps", type=float, default=0.0, help="stub uncached prompt tokens per second")
+    parser.add_argument("--completion-tokens", type=int, default=200, help="stub tokens per category answer")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of stub replies that are 429 + retry-after")
+    parser.add_argument("--rpm", type=int, default=0, help="stub requests per minute window (0 = unlimited)")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--out", help="also write the report JSON here")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-e2e-")
+    # Module-level knobs are read at import, so configure before importing the app
+    os.environ.update(OPENAI_API_KEY="stub", CACHE_DIR=os.path.join(workdir, "cache"), TRACE_LOG="0")
+    if not args.warm:
+        os.environ.update(LLM_CACHE_ENABLED="0", EXTRACT_CACHE_ENABLED="0")
+
+    pdfs = synthetic_pdfs(args.synthetic, workdir) if args.synthetic else sorted(glob.glob(args.pdfs))
+    if not pdfs:
+        parser.error(f"no PDFs match {args.pdfs}")
+
+    from Code.benchmarks.stub_openai import StubServer
+    stub = StubServer(latency=args.latency, tps=args.tps, prompt_tps=args.prompt_tps, completion_tokens=args.completion_tokens,
+                      throttle_rate=args.throttle_rate, rpm=args.rpm)
+    with stub:
+        os.environ["OPENAI_API_BASE"] = stub.api_base
+        from Code.app import app
+        logging.getLogger("httpx").setLevel(logging.WARNING)   # one line per LLM call otherwise
+        app.config["UPLOAD_FOLDER"] = os.path.join(workdir, "uploads")
+
+        config = {key: getattr(args, key) for key in ("synthetic", "stream", "warm", "latency", "tps", "prompt_tps",
+                                                        "completion_tokens", "throttle_rate", "rpm")}
+        config["pdfs"] = [os.path.basename(p) for p in pdfs]
+        report = {"config": config, "levels": []}
+        for concurrency in args.concurrency:
+            n_requests = args.requests or max(len(pdfs), 2 * concurrency)
+            stub.reset_counters()
+            level = run_level(app, pdfs, concurrency, n_requests, args.stream)
+            level["llm_requests"] = stub.requests
+            level["stub_errors"] = {str(k): v for k, v in stub.errors.items()}
+            report["levels"].append(level)
+            lat = level["latency"]
+            print(f"c={concurrency:<3} n={n_requests:<3} fail={level['failures']:<2} "
+                  f"p50={lat['p50']:.2f}s p95={lat['p95']:.2f}s p99={lat['p99']:.2f}s "
+                  f"{level['throughput_per_min']:.1f} docs/min  rss={level['peak_rss_mb']:.0f} MB  "
+                  f"extract={level['seconds_per_doc']['extract']:.2f}s (ocr {level['seconds_per_doc']['ocr_page']:.2f}s) "
+                  f"analyze={level['seconds_per_doc']['analyze']:.2f}s llm_share={level['llm_share']}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    status = 0
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(report, baseline, args.tolerance)
+        if problems is None:
+            print("baseline has a different configuration; not compared (the committed baseline is for --synthetic 4)")
+        elif problems:
+            print("REGRESSIONS vs baseline:\n  " + "\n  ".join(problems))
+            status = 1
+        else:
+            print(f"within {args.tolerance:.0%} of baseline")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
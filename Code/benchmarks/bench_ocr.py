@@ -0,0 +1,105 @@
+"""
+OCR throughput and memory of pdf_to_text_ocr per renderer, preprocessing and pool size.
+
+OCRs the last --pages pages of every PDF in Data/sample_patents (all scanned)
+and reports seconds/page, pages/sec and peak RSS (this process plus pool
+workers and pdftoppm, sampled) for each combination. Every combination runs
+in a fresh process because the OCR_* knobs are read at import. Text is
+compared with the first combination by word overlap, since preprocessing
+changes what Tesseract reads. Needs tesseract (and poppler for
+--renderers poppler).
+
+    python -m Code.benchmarks.bench_ocr --renderers poppler pymupdf --preprocess none gray --workers 1 4
+
+"poppler" with "none" is the old path: 200-DPI colour JPEGs from pdf2image.
+"""
+import argparse
+import collections
+import glob
+import multiprocessing
+import os
+import time
+
+import pdfplumber
+
+from Code.benchmarks.bench_e2e import RssSampler
+
+SAMPLES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "Data", "sample_patents"))
+
+
+def page_count(pdf_path):
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def _run(renderer, preprocess, workers, ranges, queue):
+    os.environ.update(OCR_RENDERER=renderer, OCR_PREPROCESS=preprocess)
+    from Code.base.scraping import pdf_to_text_ocr
+
+    try:
+        # Warm the pool so process start-up isn't billed to the first PDF
+        if workers > 1:
+            pdf_path, _, last = ranges[0]
+            pdf_to_text_ocr(pdf_path, last, last, workers=workers)
+
+        sampler = RssSampler()
+        sampler.start()
+        start = time.perf_counter()
+        texts = [pdf_to_text_ocr(p, first, last, workers=workers) for p, first, last in ranges]
+    except Exception as e:
+        queue.put(f"{type(e).__name__}: {e}")
+        return
+    elapsed = time.perf_counter() - start
+    queue.put((elapsed, sampler.stop(), texts))
+
+
+def word_overlap(texts, reference):
+    """Shared words / words in the reference, over all documents."""
+    shared = total = 0
+    for text, ref in zip(texts, reference):
+        words, ref_words = collections.Counter(text.split()), collections.Counter(ref.split())
+        shared += sum((words & ref_words).values())
+        total += sum(ref_words.values())
+    return shared / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=SAMPLES_DIR, help="directory of PDFs")
+    parser.add_argument("--renderers", nargs="+", default=["poppler", "pymupdf"])
+    parser.add_argument("--preprocess", nargs="+", default=["none", "gray"], help="OCR_PREPROCESS values")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--pages", type=int, default=20, help="tail pages OCR'd per PDF")
+    args = parser.parse_args()
+
+    pdfs = sorted(glob.glob(os.path.join(args.dir, "*.pdf")))
+    ranges = []
+    for pdf_path in pdfs:
+        total = page_count(pdf_path)
+        ranges.append((pdf_path, max(1, total - args.pages + 1), total))
+    n_pages = sum(last - first + 1 for _, first, last in ranges)
+    print(f"{len(pdfs)} PDFs, {n_pages} pages, cpu_count={os.cpu_count()}")
+
+    ctx = multiprocessing.get_context("spawn")
+    reference = None
+    for renderer in args.renderers:
+        for preprocess in args.preprocess:
+            for workers in args.workers:
+                queue = ctx.Queue()
+                proc = ctx.Process(target=_run, args=(renderer, preprocess, workers, ranges, queue))
+                proc.start()
+                result = queue.get()
+                proc.join()
+                if isinstance(result, str):
+                    print(f"{renderer:<8} {preprocess:<6} workers={workers:<2} failed: {result}")
+                    continue
+                elapsed, peak_rss, texts = result
+
+                reference = reference or texts
+                print(f"{renderer:<8} {preprocess:<6} workers={workers:<2} {elapsed / n_pages:6.3f} s/page  "
+                      f"{n_pages / elapsed:6.2f} pages/sec  peak RSS {peak_rss / 2 ** 20:7.1f} MB  "
+                      f"words={word_overlap(texts, reference):.1%} of first")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Legacy INID/section/claim parsing vs the single-pass patent_parser.
+
+Times the old per-field regex scans, the old whitespace-collapsing
+section splitter and the old claim splitter against one patent_parser.parse() call,
+on synthetic patents of growing size and on the extracted patent texts in
+uploads/*.txt. The PDFs in Data/sample_patents are scans without a text
+layer, so their text only exists after OCR and isn't used here.
+
+    python -m Code.benchmarks.bench_parser --sizes 100 1000 5000
+"""
+import argparse
+import glob
+import os
+import re
+import time
+
+from Code.base import patent_parser
+from Code.base.scraping import extract_claims
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+# The implementations patent_parser replaced, kept here as the baseline
+LEGACY_INID_CODES = {
+    'title': r'\(54\)\s*(.*)',
+    'abstract': r'\(57\)\s*(.*)',
+    'patent_number': r'\(11\)\s*(.*)',
+    'application_number': r'\(21\)\s*(.*)',
+    'priority_claim': r'\(30\)\s*(.*?)(?:\n\(|$)',
+    'issue_date': r'\(45\)\s*(.*)',
+    'inventor': r'\(72\)\s*(.*)',
+    'assignee': r'\(71\)\s*(.*)',
+}
+
+def legacy_inid_metadata(first_page_text):
+    data = {}
+    for key, pattern in LEGACY_INID_CODES.items():
+        m = re.search(pattern, first_page_text)
+        data[key] = m.group(1).strip() if m else ''
+    return data
+
+def legacy_text_sections(full_text):
+    text = re.sub(r'\s+', ' ', full_text)
+    section_patterns = []
+    for canon, variants in patent_parser.TEXT_SECTIONS.items():
+        for v in variants:
+            section_patterns.append(re.escape(v))
+    parts = re.split(r'(' + '|'.join(section_patterns) + r')', text)
+    sections = {}
+    current_header = None
+    for part in parts:
+        if not part.strip():
+            continue
+        for canon, variants in patent_parser.TEXT_SECTIONS.items():
+            if part.upper() in [v.upper() for v in variants]:
+                current_header = canon
+                sections[current_header] = ""
+                break
+        else:
+            if current_header:
+                sections[current_header] += part.strip() + " "
+    return {k: v.strip() for k, v in sections.items()}
+
+def legacy_split_claims(claims_text):
+    text = "\n" + claims_text.lstrip("\n")
+    start = re.search(r'\n\s*1\.\s+', text)
+    if not start:
+        return [(None, claims_text.strip())] if claims_text.strip() else []
+    claims = []
+    number, pos = 1, start.start()
+    while True:
+        nxt = re.compile(r'\n\s*%d\.\s+' % (number + 1)).search(text, pos + 1)
+        end = nxt.start() if nxt else len(text)
+        claims.append((number, text[pos:end].strip()))
+        if not nxt:
+            return claims
+        number, pos = number + 1, end
+
+def legacy_parse(text):
+    return legacy_inid_metadata(text), legacy_text_sections(text), legacy_split_claims(extract_claims(text))
+
+
+def synthetic_patent(paragraphs, claims=30):
+    """Patent-shaped text: INID header, numbered-line sections, then a claim set."""
+    lines = [
+        "(11) US 12,345,678 B2", "(45) Date of Patent: Jan. 2, 2024",
+        "(54) SYSTEM AND METHOD FOR ADJUSTING A WIDGET", "(71) Applicant: Example Corp.",
+        "(72) Inventor: A. Person", "(21) Appl. No.: 17/000,000",
+        "(30) Foreign Application Priority Data", "(57) ABSTRACT",
+        "A widget is adjusted by a controller in response to a measured load.",
+    ]
+    body = ("The widget 10 includes a housing 12 and a gear 14 coupled to a shaft 16 "
+            "so that rotation of the shaft adjusts the widget in response to the load. ")
+    headings = ["BACKGROUND OF THE INVENTION", "SUMMARY OF THE INVENTION",
+                "BRIEF DESCRIPTION OF THE DRAWINGS", "DETAILED DESCRIPTION"]
+    line_no = 5
+    for heading in headings:
+        lines.append(heading)
+        for _ in range(max(1, paragraphs // len(headings))):
+            lines.append(f"{line_no} {body}{body}")
+            line_no += 5
+    lines.append("What is claimed is:")
+    lines.append("1. A system comprising a widget, a housing and a gear.")
+    for n in range(2, claims + 1):
+        lines.append(f"{n}. The system of claim {n - 1}, wherein the gear is coupled to a shaft.")
+    return "\n".join(lines) + "\n"
+
+def read_text(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def best_of(fn, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def report(label, text, repeat):
+    legacy = best_of(legacy_parse, text, repeat)
+    single = best_of(patent_parser.parse, text, repeat)
+    parsed = patent_parser.parse(text)
+    old_claims = legacy_parse(text)[2]
+    print(f"{label:>28}: {len(text) / 1e6:6.2f} MB  legacy {legacy * 1000:8.1f} ms  "
+          f"single-pass {single * 1000:7.1f} ms  ({legacy / single:4.1f}x)  "
+          f"claims {len(parsed.claims)}/{len(old_claims)}  sections {len(parsed.sections)}  "
+          f"inid {len(parsed.inid)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000, 20000],
+                        help="synthetic patent sizes in paragraphs")
+    parser.add_argument("--texts", default=os.path.join(ROOT, "uploads", "*.txt"),
+                        help="glob of extracted patent texts")
+    parser.add_argument("--repeat", type=int, default=5, help="best of N runs")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        report(f"synthetic {size} paragraphs", synthetic_patent(size), args.repeat)
+    for text_path in sorted(glob.glob(args.texts)):
+        report(os.path.basename(text_path), read_text(text_path), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
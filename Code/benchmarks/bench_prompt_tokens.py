@@ -0,0 +1,49 @@
+"""
+Prompt tokens sent per /analyze-equivalent run, by prompt layout.
+
+Runs analyze_claims over one patent's claims against the local stub server
+(chars/4 token counts, simulated prefix cache) and reports requests, prompt
+tokens, tokens the provider could serve from its prefix cache, and the
+uncached remainder that is actually billed/processed in full.
+
+    python -m Code.benchmarks.bench_prompt_tokens --claims uploads/patent_Wight.txt
+"""
+import argparse
+import os
+
+from Code.base import patent_logic, prompt_assembly
+from Code.base.scraping import extract_claims
+from Code.benchmarks.stub_openai import StubServer
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+LAYOUTS = [("legacy", 1), ("shared_prefix", 1), ("shared_prefix", 3), ("shared_prefix", 9)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--claims", default=os.path.join(ROOT, "uploads", "patent_Wight.txt"),
+                        help="extracted patent text (.txt) to take claims from")
+    args = parser.parse_args()
+
+    with open(args.claims, encoding="utf-8") as f:
+        claims = extract_claims(f.read())
+    print(f"claims: {len(claims)} chars from {os.path.basename(args.claims)}")
+
+    with StubServer(latency=0.05) as server:
+        for layout, batch in LAYOUTS:
+            prompt_assembly.PROMPT_LAYOUT, prompt_assembly.PROMPT_BATCH = layout, batch
+            server.reset_counters()
+            # Sequential so each call can see the previous prefix, as a warm provider would
+            patent_logic.analyze_claims(
+                claims_text=claims, model="stub-model", role="user", api_key="stub",
+                api_base=server.api_base, temperature=0.1, top_p=1.0, max_tokens=4096,
+                max_workers=1, use_cache=False,
+            )
+            uncached = server.prompt_tokens - server.cached_tokens
+            label = layout + (f" batch={batch}" if batch > 1 else "")
+            print(f"{label:>22}: requests={server.requests:<2} prompt_tokens={server.prompt_tokens:<6} "
+                  f"cached={server.cached_tokens:<6} uncached={uncached}")
+
+
+if __name__ == "__main__":
+    main()
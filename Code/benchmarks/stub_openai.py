@@ -0,0 +1,235 @@
+"""
+Minimal OpenAI-compatible stub server for local benchmarks.
+
+Implements POST /v1/chat/completions with an artificial latency so the
+LLM side of the pipeline can be measured without hitting a real provider.
+Each reply takes `latency` plus uncached prompt tokens at `prompt_tps` plus
+`completion_tokens` at `tps` (streamed replies spread their chunks over the
+generation time). `error_rate` answers a random 429/503 and `throttle_rate`
+a 429 with retry-after, on top of the optional `rpm` window.
+
+Token counts are chars/4. Prefix caching is simulated the way OpenAI-style
+providers report it: the longest prefix shared with an earlier prompt counts
+as cached_tokens, in 128-token blocks, once it reaches 1024 tokens.
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        server = self.server
+        limited, rate_headers = server.check_rate_limit()
+        if limited or random.random() < server.error_rate:
+            status = 429 if limited or random.random() < 0.5 else 503
+            self._error(status, rate_headers)
+            return
+        if random.random() < server.throttle_rate:
+            self._error(429, {**rate_headers, "retry-after": f"{server.retry_after:.3f}"})
+            return
+
+        prompt = "".join(f"<{m.get('role')}>{m.get('content') or ''}" for m in body.get("messages", []))
+        prompt_tokens, cached_tokens = server.account(prompt)
+        content = server.reply_text()
+        keys = re.search(r'exactly these keys: (\[.*?\])', prompt)
+        if keys:
+            content = json.dumps({k: server.reply_text() for k in json.loads(keys.group(1))})
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        first_token = server.latency + ((prompt_tokens - cached_tokens) / server.prompt_tps if server.prompt_tps else 0.0)
+        generation = usage["completion_tokens"] / server.tps if server.tps else 0.0
+
+        with server.lock:
+            server.requests += 1
+            server.inflight += 1
+            server.peak_inflight = max(server.peak_inflight, server.inflight)
+        try:
+            time.sleep(first_token)
+            if body.get("stream"):
+                include_usage = (body.get("stream_options") or {}).get("include_usage")
+                self._stream_reply(body, rate_headers, content, generation, usage if include_usage else None)
+                return
+            time.sleep(generation)
+        finally:
+            with server.lock:
+                server.inflight -= 1
+
+        payload = {
+            "id": f"stub-{server.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in rate_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status, headers):
+        with self.server.lock:
+            self.server.errors[status] = self.server.errors.get(status, 0) + 1
+        data = json.dumps({"error": {"message": f"stub {status}", "type": "stub_error", "code": status}}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream_reply(self, body, headers, content, generation, usage=None):
+        """Send the reply as chat.completion.chunk server-sent events, word by word over `generation` seconds."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.close_connection = True
+        pieces = re.findall(r'\S+\s*', content) or [content]
+        base = {"id": f"stub-{self.server.requests}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": body.get("model", "stub")}
+        for piece in pieces:
+            time.sleep(generation / len(pieces))
+            chunk = {**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        if usage is not None:
+            self.wfile.write(f"data: {json.dumps({**base, 'choices': [], 'usage': usage})}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.5, rpm=0, error_rate=0.0,
+                 tps=0.0, prompt_tps=0.0, completion_tokens=4, throttle_rate=0.0, retry_after=1.0):
+        super().__init__((host, port), StubHandler)
+        self.latency = latency                  # seconds before the first token
+        self.rpm = rpm                          # requests per 60s window; 0 = unlimited, no rate-limit headers
+        self.error_rate = error_rate            # fraction of requests answered with a random 429/503
+        self.tps = tps                          # completion tokens per second; 0 = instant
+        self.prompt_tps = prompt_tps            # uncached prompt tokens per second added to latency; 0 = free
+        self.completion_tokens = completion_tokens  # approximate tokens per category answer
+        self.throttle_rate = throttle_rate      # fraction of requests answered 429 with retry-after
+        self.retry_after = retry_after
+        self.errors = {}
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.inflight = 0
+        self.peak_inflight = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self._prompts = []
+
+    def reply_text(self):
+        """A category answer of about completion_tokens tokens (chars/4)."""
+        text = "No issues found."
+        filler = " The claim language is consistent with the specification."
+        while len(text) // 4 < self.completion_tokens:
+            text += filler
+        return text
+
+    def account(self, prompt):
+        """Record a prompt; returns (prompt_tokens, cached_tokens) for its usage block."""
+        with self.lock:
+            shared = max((len(os.path.commonprefix([prompt, p])) for p in self._prompts), default=0)
+            self._prompts = (self._prompts + [prompt])[-256:]
+            prompt_tokens = len(prompt) // 4
+            cached = (shared // 4) // 128 * 128 if shared // 4 >= 1024 else 0
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached
+        return prompt_tokens, cached
+
+    def check_rate_limit(self):
+        """(limited, headers) for a fixed 60s request window, OpenAI header style."""
+        if not self.rpm:
+            return False, {}
+        with self.lock:
+            now = time.monotonic()
+            if now - self._window_start >= 60:
+                self._window_start, self._window_count = now, 0
+            reset = max(0.0, 60 - (now - self._window_start))
+            limited = self._window_count >= self.rpm
+            if not limited:
+                self._window_count += 1
+            headers = {
+                "x-ratelimit-limit-requests": str(self.rpm),
+                "x-ratelimit-remaining-requests": str(max(0, self.rpm - self._window_count)),
+                "x-ratelimit-reset-requests": f"{reset:.3f}s",
+            }
+            if limited:
+                headers["retry-after"] = f"{reset:.3f}"
+        return limited, headers
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests = self.peak_inflight = self.prompt_tokens = self.cached_tokens = 0
+            self._prompts = []
+            self.errors = {}
+
+    @property
+    def api_base(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--rpm", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tps", type=float, default=0.0, help="completion tokens per second (0 = instant)")
+    parser.add_argument("--prompt-tps", type=float, default=0.0, help="uncached prompt tokens per second (0 = free)")
+    parser.add_argument("--completion-tokens", type=int, default=4)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered 429 + retry-after")
+    args = parser.parse_args()
+
+    server = StubServer(port=args.port, latency=args.latency, rpm=args.rpm, error_rate=args.error_rate,
+                        tps=args.tps, prompt_tps=args.prompt_tps, completion_tokens=args.completion_tokens,
+                        throttle_rate=args.throttle_rate)
+    print(f"stub OpenAI server on {server.api_base}")
+    server.serve_forever()
@@ -0,0 +1,31 @@
+"""
+gunicorn settings for the web app; gunicorn reads this file from the
+working directory, so from the repo root:
+
+    gunicorn Code.app:app
+
+With preload_app the master imports the app once and when_ready runs
+Code.app.warm_up before any worker is forked, so workers start with the
+PDF, OCR and LLM libraries and the tokenizer already loaded (shared
+copy-on-write) instead of each paying for them on its first /analyze.
+Without preload every worker warms itself up after it boots.
+"""
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))       # gthread; /analyze/stream holds a thread per client
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "600"))     # a synchronous /analyze with OCR can take minutes
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+    # Runs in the master after the (preloaded) app is imported, before workers fork
+    if preload_app:
+        from Code.app import warm_up
+        warm_up()
+
+def post_worker_init(worker):
+    if not preload_app:
+        from Code.app import warm_up
+        warm_up()
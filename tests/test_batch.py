@@ -0,0 +1,24 @@
+import json
+
+from Code import batch
+
+
+def test_status_of_failed_categories():
+    assert batch._status({"attempted": ["a", "b"], "failed": []}) == "done"
+    assert batch._status({"attempted": ["a", "b"], "failed": ["a"]}) == "partial"
+    assert batch._status({"attempted": ["a", "b"], "failed": ["a", "b"]}) == "failed"
+
+
+def test_only_done_documents_are_skipped(tmp_path):
+    out = tmp_path / "results.jsonl"
+    out.write_text("".join(json.dumps({"sha256": sha, "status": status}) + "\n"
+                           for sha, status in [("a", "done"), ("b", "partial"), ("c", "failed")]) + '{"sha256": "d", "sta')
+    assert batch.load_done(str(out)) == {"a"}
+
+
+def test_unreadable_path_is_recorded(tmp_path):
+    out = tmp_path / "results.jsonl"
+    counts = batch.run_batch([str(tmp_path / "missing.pdf")], str(out), settings={}, extract_workers=1, llm_workers=1)
+    assert counts["failed"] == 1
+    record = json.loads(out.read_text())
+    assert record["status"] == "failed" and record["stage"] == "hash" and "missing.pdf" in record["path"]
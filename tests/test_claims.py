@@ -0,0 +1,25 @@
+from Code.base import patent_parser
+from Code.base.claims import parse_claims
+from Code.base.scraping import split_claims
+
+CLAIMS = """1. A widget comprising a lever, wherein step 1. is optional.
+2. The widget of claim 1, wherein the lever turns.
+  3. The widget of claim 2, further comprising:
+a frame; and
+a gear.
+4. The widget of claims 1 to 3, wherein the gear is steel."""
+
+
+def test_splitters_agree():
+    split = split_claims(CLAIMS)
+    claim_set = parse_claims(CLAIMS)
+    parsed = patent_parser.parse("\n" + CLAIMS).claim_texts()
+    assert [n for n, _ in split] == claim_set.numbers() == [n for n, _ in parsed] == [1, 2, 3, 4]
+    assert split == parsed == [(n, claim_set.claim_text(n)) for n in claim_set.numbers()]
+    assert claim_set[4].parents == (1, 2, 3)
+
+
+def test_unnumbered_claims_text():
+    assert split_claims("A widget.") == [(None, "A widget.")]
+    assert split_claims("") == []
+    assert len(parse_claims("A widget.")) == 0
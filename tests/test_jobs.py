@@ -0,0 +1,73 @@
+import sqlite3
+import time
+import threading
+
+from Code.base import jobs
+from Code.base.jobs import JobQueue, JobStore
+
+
+class FlakyStore(JobStore):
+    """Claim fails with "database is locked" a few times, then hands out one job."""
+
+    def __init__(self, path, failures):
+        super().__init__(path)
+        self.failures = failures
+        self.claimed = threading.Event()
+
+    def claim(self, worker):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        job_id = super().claim(worker)
+        if job_id:
+            self.claimed.set()
+        return job_id
+
+
+def test_dispatcher_survives_database_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_POLL_SECONDS", 0.01)
+    store = FlakyStore(str(tmp_path / "jobs.sqlite3"), failures=3)
+    queue = JobQueue(store, workers=1)
+    queue._run = lambda job_id: queue._slots.release()
+    queue.submit("patent.pdf")
+    queue.start()
+    assert store.claimed.wait(5)
+
+
+def _backdate(store, job_id, seconds):
+    with store._connect() as conn:
+        conn.execute("UPDATE jobs SET updated = updated - ? WHERE id = ?", (seconds, job_id))
+
+
+def test_only_jobs_without_heartbeat_are_requeued(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    alive, dead = store.create("a.pdf"), store.create("b.pdf")
+    assert store.claim("w1") and store.claim("w1")
+    _backdate(store, alive, 1000)
+    _backdate(store, dead, 1000)
+    store.heartbeat([alive], "w1")
+    assert store.requeue_stale(stale_seconds=300) == 1
+    assert store.get(alive)["status"] == jobs.RUNNING
+    assert store.get(dead)["status"] == jobs.QUEUED
+
+
+def test_running_job_sends_heartbeats(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_HEARTBEAT_SECONDS", 0.05)
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    queue = JobQueue(store, workers=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow_pipeline(upload_path, **kwargs):
+        started.set()
+        release.wait(5)
+        return {}
+
+    monkeypatch.setattr("Code.base.pipeline.run_pipeline", slow_pipeline)
+    job_id = queue.submit("patent.pdf")
+    queue.start()
+    assert started.wait(5)
+    _backdate(store, job_id, 1000)
+    time.sleep(0.3)
+    assert store.requeue_stale(stale_seconds=300) == 0
+    release.set()
@@ -0,0 +1,33 @@
+import threading
+
+from Code.base import llm_client
+from Code.base.llm_client import RateLimiter, TokenBucket
+
+
+def _acquire_within(limiter, cost, timeout):
+    """Run limiter.acquire(cost) on a thread; True if it returned within timeout seconds."""
+    done = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.acquire(cost), done.set()), daemon=True)
+    thread.start()
+    return done.wait(timeout)
+
+
+def test_missing_reset_header_still_refills(monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_RATELIMIT_WINDOW", 0.2)
+    limiter = RateLimiter()
+    limiter.update({"x-ratelimit-limit-tokens": "100000", "x-ratelimit-remaining-tokens": "500"})
+    assert _acquire_within(limiter, 2000, timeout=5)
+
+
+def test_zero_reset_means_full_bucket():
+    limiter = RateLimiter()
+    limiter.update({"x-ratelimit-limit-requests": "60", "x-ratelimit-remaining-requests": "0",
+                    "x-ratelimit-reset-requests": "0s"})
+    assert _acquire_within(limiter, 1, timeout=1)
+
+
+def test_wait_has_a_deadline(monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_LIMITER_MAX_WAIT", 0.2)
+    bucket = TokenBucket()
+    bucket.update(1000, 0, 3600)   # empty for an hour
+    assert _acquire_within(bucket, 10, timeout=2)
@@ -0,0 +1,72 @@
+import pytest
+
+from Code.base import patent_logic
+
+
+def _claims(n):
+    lines = ["1. A widget comprising a frame and " + "a lever " * 200 + "."]
+    for number in range(2, n + 1):
+        lines.append(f"{number}. The widget of claim 1, wherein the lever number {number} " + "turns " * 100 + ".")
+    return "\n".join(lines)
+
+
+def test_chunks_carry_ancestor_claims(monkeypatch):
+    monkeypatch.setattr(patent_logic, "LLM_CONTEXT_TOKENS", 4000)
+    monkeypatch.setattr(patent_logic, "LLM_MIN_COMPLETION_TOKENS", 500)
+    monkeypatch.setattr("Code.base.tokens.LLM_CONTEXT_TOKENS", 4000)
+    monkeypatch.setattr("Code.base.tokens.LLM_MIN_COMPLETION_TOKENS", 500)
+    calls = patent_logic._plan_calls("Review these claims: {claims}", _claims(20), 1000, "You are a patent attorney.")
+    assert len(calls) > 1
+    for label, chunk_text, _, _ in calls:
+        assert chunk_text.startswith("1. A widget"), label
+
+
+def test_failed_chunk_fails_the_category():
+    merged = patent_logic._merge_chunks([("Claims 1-5", "Looks fine."), ("Claims 6-9", "Error: timeout")])
+    assert merged.startswith("Error:")
+    assert "Claims 6-9" in merged
+    assert patent_logic._merge_chunks([("Claims 1-5", "A."), ("Claims 6-9", "B.")]) == "Claims 1-5:\nA.\n\nClaims 6-9:\nB."
+
+
+def test_incremental_reruns_only_changed_families(monkeypatch):
+    from Code.base.claims import parse_claims
+    from Code.base.scraping import extract_claims
+
+    sent = []
+
+    def fake_analyze(claims_text, **settings):
+        sent.append(claims_text)
+        return {"glossary_recommendation": "ok"}
+
+    monkeypatch.setattr(patent_logic, "analyze_claims", fake_analyze)
+    settings = dict(model="m", role="user", api_base="", api_key="", temperature=0, top_p=1, max_tokens=100)
+    with open("uploads/patent_Wight.txt", encoding="utf-8") as f:
+        claims = extract_claims(f.read())
+    first = patent_logic.analyze_claims_incremental(parse_claims(claims), **settings)
+    families = first["families"]
+    assert len(sent) == len(families) > 1
+    # Every claim is sent exactly once
+    assert sorted(n for family in families for n in family) == list(range(1, 15))
+    assert sum(len(text) for text in sent) <= len(claims)
+
+    sent.clear()
+    edited = claims.replace("2. ", "2. Slightly reworded, ", 1)
+    again = patent_logic.analyze_claims_incremental(parse_claims(edited), previous=first["snapshot"], **settings)
+    assert len(sent) == 1
+    assert again["reanalyzed"] == families[0]
+
+
+def test_oversized_claim_is_not_sent(monkeypatch):
+    monkeypatch.setattr(patent_logic, "LLM_CONTEXT_TOKENS", 4000)
+    monkeypatch.setattr(patent_logic, "LLM_MIN_COMPLETION_TOKENS", 500)
+    monkeypatch.setattr("Code.base.tokens.LLM_CONTEXT_TOKENS", 4000)
+    monkeypatch.setattr("Code.base.tokens.LLM_MIN_COMPLETION_TOKENS", 500)
+    claims = "1. A widget comprising " + "a lever " * 3000 + ".\n2. The widget of claim 1, wherein it turns."
+    calls = patent_logic._plan_calls("Review these claims:", claims, 1000, "user")
+    assert all(call[3] is None for call in calls)
+
+    monkeypatch.setattr(patent_logic, "get_endpoint", lambda api_base, api_key: None)
+    monkeypatch.setattr(patent_logic, "_run_route", lambda *args, **kwargs: pytest.fail("oversized chunk sent"))
+    results = patent_logic.analyze_claims(claims, model="m", role="user", api_base="", api_key="", temperature=0,
+                                          top_p=1, max_tokens=1000, use_cache=False)
+    assert all(text.startswith("Error:") and "too large" in text for text in results.values())
@@ -0,0 +1,41 @@
+import fitz
+import pytest
+
+from Code.base import cache, pipeline, prescreen
+from Code.base.scraping import extract_claims
+
+
+@pytest.fixture(autouse=True)
+def _no_cache(monkeypatch):
+    monkeypatch.setattr(cache, "EXTRACT_CACHE_ENABLED", False)
+    monkeypatch.setattr(prescreen, "PRESCREEN_MODE", "off")
+
+
+def _pdf(tmp_path, pages):
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_text((40, 50), text, fontsize=9)
+    path = tmp_path / "patent.pdf"
+    doc.save(path)
+    doc.close()
+    return str(path)
+
+
+def test_claim_one_at_start_of_text():
+    assert extract_claims("1. A method comprising a step.\n2. The method of claim 1.").startswith("1. A method")
+
+
+def test_claims_on_their_own_page(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "analyze_claims", lambda claims_text, **kwargs: {"claims": claims_text})
+    path = _pdf(tmp_path, ["DETAILED DESCRIPTION\nThe widget is adjusted.",
+                           "1. A method of adjusting a widget.\n2. The method of claim 1, wherein it turns."])
+    out = pipeline.run_pipeline(path, settings={"model": "stub"}, content_hash="test-claims-page")
+    assert out["results"]["claims"].startswith("1. A method")
+
+
+def test_no_claims_never_calls_the_llm(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "analyze_claims", lambda **kwargs: pytest.fail("LLM called without claims"))
+    # A PDF without claims would fall back to OCR; hand the pipeline its text directly
+    monkeypatch.setattr(pipeline, "get_pdf_text", lambda *args, **kwargs: "DETAILED DESCRIPTION\nThe widget is adjusted.")
+    with pytest.raises(pipeline.NoClaimsFound):
+        pipeline.run_pipeline("patent.pdf", settings={"model": "stub"}, content_hash="test-no-claims")
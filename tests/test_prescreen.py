@@ -0,0 +1,11 @@
+from Code.base import prescreen
+from Code.base.claims import parse_claims
+
+
+def test_failed_covered_category_keeps_error_marker():
+    claim_set = parse_claims("1. A widget comprising a lever.\n2. The widget of claim 1, wherein said gear turns.")
+    findings = prescreen.screen(claim_set)
+    category = next(iter(prescreen.CATEGORIES.values()))
+    text = prescreen.resolve(category, "Error: timeout", findings)
+    assert text.startswith("Error: timeout")
+    assert "pre-screen findings" in text
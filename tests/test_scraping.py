@@ -0,0 +1,21 @@
+import os
+
+from Code.base import scraping
+
+
+def die_once(marker, page_num):
+    """Kills its pool worker the first time it runs, then answers normally."""
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return page_num * 10
+
+
+def test_broken_ocr_pool_is_replaced(tmp_path):
+    marker = str(tmp_path / "died")
+    outputs = scraping._run_in_ocr_pool(2, die_once, [1, 2, 3], lambda n: (marker, n))
+    assert outputs == [10, 20, 30]
+    pool = scraping._ocr_pools[2]
+    assert scraping._run_in_ocr_pool(2, die_once, [4], lambda n: (marker, n)) == [40]
+    assert scraping._ocr_pools[2] is pool
+    scraping._discard_ocr_pool(2, pool)
@@ -0,0 +1,63 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from Code.base import uploads
+from Code.base.uploads import UploadTooLarge, UploadWriter, enforce_quota, ingest
+
+
+@pytest.fixture
+def client(tmp_path):
+    from Code.app import app
+    app.config["UPLOAD_FOLDER"] = str(tmp_path)
+    return app.test_client()
+
+
+def _post(client, body, name="patent.pdf"):
+    # /jobs only queues the upload, so no LLM or extraction runs
+    return client.post("/jobs", data={"patent": (io.BytesIO(body), name)}, content_type="multipart/form-data")
+
+
+def test_multipart_upload_is_stored_by_hash(client, tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    submitted = []
+
+    class Queue:
+        def submit(self, path, filename=None):
+            submitted.append(path)
+            return "job"
+
+    monkeypatch.setattr("Code.app.get_job_queue", Queue)
+    body = b"%PDF-1.4 patent" * 1000
+    assert _post(client, body).status_code == 202
+    assert submitted == [str(tmp_path / f"{hashlib.sha256(body).hexdigest()}.pdf")]
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(submitted[0])]   # no temp files left
+
+
+def test_rejected_parts_leave_no_files(client, tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    assert _post(client, b"not a pdf", name="notes.txt").status_code == 400
+    assert os.listdir(tmp_path) == []
+
+
+def test_writer_over_limit(tmp_path):
+    writer = UploadWriter(str(tmp_path), max_bytes=10)
+    writer.write(b"x" * 11)
+    with pytest.raises(UploadTooLarge):
+        writer.commit()
+    assert os.listdir(tmp_path) == []
+
+
+def test_reupload_after_eviction(tmp_path, monkeypatch):
+    first = ingest(io.BytesIO(b"same bytes"), folder=str(tmp_path))
+    os.remove(first.path)   # evicted by another request
+    again = ingest(io.BytesIO(b"same bytes"), folder=str(tmp_path))
+    assert os.path.exists(again.path)
+
+
+def test_quota_ignores_vanished_keep(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_MIN_AGE", 0)
+    stored = ingest(io.BytesIO(b"old upload"), folder=str(tmp_path))
+    assert enforce_quota(str(tmp_path), quota_bytes=0, keep=str(tmp_path / ("0" * 64 + ".pdf"))) == stored.size